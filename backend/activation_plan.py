@@ -0,0 +1,172 @@
+"""
+Compilation of submitted MCP configs into cached activation plans.
+A plan is the validated config with every ${VAR} placeholder resolved, plus the pool
+fingerprint of the result. Plans are cached by a hash of the submitted config and
+reused as long as the environment variables they reference keep their values, so
+repeat activations skip validation and substitution entirely.
+"""
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, model_validator
+
+try:
+    from .client_pool import config_fingerprint
+except ImportError:
+    from client_pool import config_fingerprint
+
+ENV_VAR_PATTERN = re.compile(r"\$\{([^}]+)\}")
+
+
+class MCPServerConfig(BaseModel):
+    """One entry of mcpServers; unknown keys are passed through to mcp_use."""
+    model_config = ConfigDict(extra="allow")
+
+    command: Optional[str] = None
+    args: Optional[List[str]] = None
+    env: Optional[Dict[str, str]] = None
+    url: Optional[str] = None
+    ws_url: Optional[str] = None
+    headers: Optional[Dict[str, str]] = None
+    cacheTools: Optional[Dict[str, float]] = None
+    startupTimeout: Optional[float] = Field(default=None, gt=0)
+    notifyCancelled: Optional[bool] = None
+    maxConcurrency: Optional[int] = Field(default=None, ge=1)
+
+    @model_validator(mode="after")
+    def check_transport(self) -> "MCPServerConfig":
+        if not (self.command or self.url or self.ws_url):
+            raise ValueError("Server needs a command (stdio), url (HTTP/SSE) or ws_url (WebSocket)")
+        if self.command and self.args is None:
+            # mcp_use only treats servers with args as stdio servers
+            self.args = []
+        return self
+
+
+class MCPConfig(BaseModel):
+    """Activation config as submitted by the frontend."""
+    model_config = ConfigDict(extra="allow")
+
+    mcpServers: Dict[str, MCPServerConfig] = Field(min_length=1)
+
+
+class ActivationPlanError(ValueError):
+    """Raised when a config is invalid; errors use the shape of request validation errors."""
+
+    def __init__(self, message: str, errors: List[Dict[str, str]]):
+        super().__init__(message)
+        self.errors = errors
+
+
+@dataclass
+class ActivationPlan:
+    """A validated config with placeholders resolved, ready to hand to the client pool."""
+    config_hash: str
+    config: Dict[str, Any]
+    fingerprint: str
+    server_names: List[str]
+    # Values of the referenced environment variables when the plan was compiled
+    env_snapshot: Dict[str, Optional[str]]
+
+    def is_current(self) -> bool:
+        return all(os.getenv(name) == value for name, value in self.env_snapshot.items())
+
+
+def hash_config(config: Dict[str, Any]) -> str:
+    payload = json.dumps(config, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _collect_env_vars(value: Any, path: str, found: Dict[str, List[str]]) -> None:
+    """Record every ${VAR} reference with the config paths it appears at."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _collect_env_vars(item, f"{path}.{key}" if path else str(key), found)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            _collect_env_vars(item, f"{path}.{index}", found)
+    elif isinstance(value, str) and "${" in value:
+        for name in ENV_VAR_PATTERN.findall(value):
+            found.setdefault(name, []).append(path)
+
+
+def _substitute(value: Any, env: Dict[str, str]) -> Any:
+    if isinstance(value, dict):
+        return {key: _substitute(item, env) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_substitute(item, env) for item in value]
+    if isinstance(value, str) and "${" in value:
+        return ENV_VAR_PATTERN.sub(lambda match: env[match.group(1)], value)
+    return value
+
+
+def compile_plan(config: Dict[str, Any], config_hash: Optional[str] = None) -> ActivationPlan:
+    """Validate a config and resolve its placeholders, reporting every problem at once."""
+    try:
+        validated = MCPConfig.model_validate(config)
+    except ValidationError as e:
+        errors = [
+            {
+                "field": ".".join(str(loc) for loc in error["loc"]),
+                "message": error["msg"],
+                "type": error["type"],
+            }
+            for error in e.errors()
+        ]
+        raise ActivationPlanError("Invalid configuration.", errors) from e
+
+    normalized = validated.model_dump(exclude_none=True)
+    references: Dict[str, List[str]] = {}
+    _collect_env_vars(normalized, "", references)
+    env = {name: os.getenv(name) for name in references}
+    missing = [name for name, value in env.items() if value is None]
+    if missing:
+        errors = [
+            {"field": path, "message": f"Environment variable {name} not found", "type": "env_var.missing"}
+            for name in missing
+            for path in references[name]
+        ]
+        raise ActivationPlanError(f"Missing environment variables: {', '.join(missing)}", errors)
+
+    resolved = _substitute(normalized, env)
+    return ActivationPlan(
+        config_hash=config_hash or hash_config(config),
+        config=resolved,
+        fingerprint=config_fingerprint(resolved),
+        server_names=list(resolved["mcpServers"].keys()),
+        env_snapshot=env,
+    )
+
+
+class ActivationPlanCache:
+    """LRU of compiled plans keyed by the hash of the submitted config."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._plans: "OrderedDict[str, ActivationPlan]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_plan(self, config: Dict[str, Any]) -> ActivationPlan:
+        """Return the cached plan for a config, compiling it on a miss or after env changes."""
+        config_hash = hash_config(config)
+        plan = self._plans.get(config_hash)
+        if plan is not None and plan.is_current():
+            self._plans.move_to_end(config_hash)
+            self.hits += 1
+            return plan
+        self.misses += 1
+        plan = compile_plan(config, config_hash)
+        self._plans[config_hash] = plan
+        self._plans.move_to_end(config_hash)
+        while len(self._plans) > self.max_entries:
+            self._plans.popitem(last=False)
+        return plan
+
+    def stats(self) -> dict:
+        return {"plans": len(self._plans), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,102 @@
+"""
+Global admission control for agent runs.
+A bounded semaphore caps how many agent runs execute at once, and a bounded wait
+queue caps how many more may wait for a slot. Anything beyond that is rejected.
+A run on a session also waits for the session's previous run; that wait is queued
+and timed like the wait for a slot, so piling up on one session is rejected too.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a run cannot be admitted; carries the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded, time-limited wait queue."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def is_saturated(self, lock: Optional[asyncio.Lock] = None) -> bool:
+        """True if a new run (waiting for lock, if given) would be rejected right now."""
+        must_wait = self._semaphore.locked() or (lock is not None and lock.locked())
+        return must_wait and self.waiting >= self.max_queue
+
+    async def acquire(self, lock: Optional[asyncio.Lock] = None) -> None:
+        """
+        Wait for a run slot, or raise AdmissionRejected. A lock passed in, normally the
+        session's, is acquired first and held along with the slot.
+        """
+        if self.is_saturated(lock):
+            self.rejected += 1
+            raise AdmissionRejected(
+                "Server is busy. Too many queries are queued, please retry shortly.",
+                status_code=429,
+                retry_after=1,
+            )
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                if lock is not None:
+                    await lock.acquire()
+                try:
+                    await self._semaphore.acquire()
+                except BaseException:
+                    if lock is not None:
+                        lock.release()
+                    raise
+        except TimeoutError:
+            self.timed_out += 1
+            raise AdmissionRejected(
+                "Server is busy. Timed out waiting for a free query slot.",
+                status_code=503,
+                retry_after=max(int(self.queue_timeout), 1),
+            )
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        self.admitted += 1
+
+    def release(self, lock: Optional[asyncio.Lock] = None) -> None:
+        """Give a run slot back, and the lock it was acquired with."""
+        self.running -= 1
+        self._semaphore.release()
+        if lock is not None:
+            lock.release()
+
+    @asynccontextmanager
+    async def slot(self, lock: Optional[asyncio.Lock] = None) -> AsyncIterator[None]:
+        """Hold a run slot, and the given lock, for the duration of the block."""
+        await self.acquire(lock)
+        try:
+            yield
+        finally:
+            self.release(lock)
+
+    def stats(self) -> dict:
+        """Return queue occupancy and admission counters."""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
@@ -0,0 +1,335 @@
+"""
+Helpers for observing an MCPAgent run while it executes.
+LLM tokens and tool calls are captured through a LangChain callback handler that is
+injected via a context variable, so it only sees the run it was installed for.
+Runs can be given a step, token and wall-clock budget; a run that exhausts one is
+stopped between steps and answers with what it gathered so far.
+"""
+import asyncio
+import json
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.tracers.context import register_configure_hook
+from mcp_use import MCPAgent
+
+try:
+    from .conversation_memory import estimate_tokens, is_memory_call, message_tokens
+except ImportError:
+    from conversation_memory import estimate_tokens, is_memory_call, message_tokens
+
+RunEvent = Tuple[str, Optional[dict]]
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+# Characters of each tool result given to the final answer of a stopped run
+PARTIAL_RESULT_CHARS = 2000
+
+PARTIAL_ANSWER_INSTRUCTIONS = (
+    "You were answering the user's question with tools but ran out of {budget}. "
+    "Answer now as well as you can from the tool results below, without calling tools, "
+    "and say briefly what could not be checked."
+)
+
+BUDGET_NAMES = {
+    "max_steps": "the step budget",
+    "max_tokens": "the token budget",
+    "deadline": "the time budget",
+}
+
+
+@dataclass
+class RunBudget:
+    """Limits for one agent run; None leaves a limit unset."""
+    # Tool-using steps (LLM turns, however many tools each calls), like MCP_MAX_STEPS,
+    # which still applies
+    max_steps: Optional[int] = None
+    # LLM tokens, prompt and completion, as reported by the provider or estimated
+    max_tokens: Optional[int] = None
+    # Wall-clock milliseconds from the start of the run
+    deadline_ms: Optional[int] = None
+
+    def __bool__(self) -> bool:
+        return any(limit is not None for limit in (self.max_steps, self.max_tokens, self.deadline_ms))
+
+_run_events_handler: ContextVar[Optional["RunEventHandler"]] = ContextVar(
+    "mcp_run_events_handler", default=None
+)
+register_configure_hook(_run_events_handler, inheritable=True)
+
+
+class RunEventHandler(AsyncCallbackHandler):
+    """Forward LLM tokens and tool call boundaries of one run to a queue; memory upkeep calls are not part of it."""
+
+    def __init__(self, queue: asyncio.Queue, max_tokens: Optional[int] = None):
+        self.queue = queue
+        self.max_tokens = max_tokens
+        self.tokens = 0
+        self._prompt_tokens: Dict[Any, int] = {}
+
+    async def on_chat_model_start(self, serialized: dict, messages: Any, *, run_id, **kwargs: Any) -> None:
+        if is_memory_call(kwargs.get("tags")):
+            return
+        self._prompt_tokens[run_id] = sum(message_tokens(message) for batch in messages for message in batch)
+
+    async def on_llm_end(self, response: Any, *, run_id, **kwargs: Any) -> None:
+        if is_memory_call(kwargs.get("tags")):
+            return
+        prompt_tokens = self._prompt_tokens.pop(run_id, 0)
+        used = reported_tokens(response)
+        if used is None:
+            # Streamed responses usually carry no usage; estimate like the memory budget does
+            text = "".join(generation.text for batch in response.generations for generation in batch)
+            used = prompt_tokens + estimate_tokens(text)
+        self.tokens += used
+        # A call that already produced the answer is let through; only further steps are stopped
+        if self.max_tokens is not None and self.tokens >= self.max_tokens and _requests_tools(response):
+            await self.queue.put(("budget", {"reason": "max_tokens"}))
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token and not is_memory_call(kwargs.get("tags")):
+            await self.queue.put(("token", {"text": token}))
+
+    async def on_tool_start(self, serialized: dict, input_str: str, *, run_id, **kwargs: Any) -> None:
+        await self.queue.put(("tool_start", {
+            "id": str(run_id),
+            "tool": (serialized or {}).get("name") or kwargs.get("name"),
+            "input": input_str,
+        }))
+
+    async def on_tool_end(self, output: Any, *, run_id, **kwargs: Any) -> None:
+        await self.queue.put(("tool_end", {
+            "id": str(run_id),
+            "tool": kwargs.get("name"),
+            "output": str(output),
+        }))
+
+    async def on_tool_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+        await self.queue.put(("tool_error", {
+            "id": str(run_id),
+            "tool": kwargs.get("name"),
+            "error": str(error),
+        }))
+
+
+def reported_tokens(response: Any) -> Optional[int]:
+    """Total tokens of an LLM call as reported by the provider, if it reported them."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage.get("total_tokens"):
+        return usage["total_tokens"]
+    total = 0
+    for batch in response.generations:
+        for generation in batch:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                total += metadata.get("total_tokens", 0)
+    return total or None
+
+
+def _turn_message(action: Any) -> Optional[Any]:
+    """The LLM message an action came from; actions of parallel tool calls share it."""
+    message_log = getattr(action, "message_log", None)
+    return message_log[-1] if message_log else None
+
+
+def _requests_tools(response: Any) -> bool:
+    return any(
+        getattr(getattr(generation, "message", None), "tool_calls", None)
+        for batch in response.generations
+        for generation in batch
+    )
+
+
+async def stream_agent_run(
+    agent: MCPAgent,
+    query: str,
+    heartbeat_interval: float = 15.0,
+    budget: Optional[RunBudget] = None,
+) -> AsyncIterator[RunEvent]:
+    """
+    Run the agent in a background task and yield (event, data) pairs as they happen.
+    Yields ("ping", None) whenever nothing happened for heartbeat_interval seconds.
+    The run is cancelled if the consumer stops iterating.
+
+    A step is one LLM turn that called tools, as MCPAgent counts them against
+    max_steps; a turn with parallel tool calls yields a "step" event per call, all
+    carrying the same step number.
+
+    With a budget, the run is cancelled as soon as one is exhausted (the step budget
+    after all calls of a step, the token budget after an LLM call, the deadline at any
+    point) and the "final" event carries a partial answer plus the budget as "stopped".
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    budget = budget or RunBudget()
+    handler = RunEventHandler(queue, max_tokens=budget.max_tokens)
+    gathered: List[Tuple[str, str]] = []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget.deadline_ms / 1000 if budget.deadline_ms is not None else None
+    steps = 0
+
+    async def _run() -> None:
+        nonlocal steps
+        _run_events_handler.set(handler)
+        turn_message = None
+        calls_left = 0
+        try:
+            async for item in agent.stream(query, manage_connector=False):
+                if isinstance(item, str):
+                    await queue.put(("final", {"result": item, "steps": steps}))
+                    continue
+                action, observation = item
+                message = _turn_message(action)
+                if message is None or message is not turn_message or calls_left <= 0:
+                    steps += 1
+                    turn_message = message
+                    calls_left = len(getattr(message, "tool_calls", None) or ()) or 1
+                calls_left -= 1
+                gathered.append((action.tool, str(observation)))
+                await queue.put(("step", {"step": steps, "tool": action.tool}))
+                # The agent executes all calls of a turn before yielding them, so the step
+                # budget is checked once the turn's last call has been reported
+                if not calls_left and budget.max_steps is not None and steps >= budget.max_steps:
+                    await queue.put(("budget", {"reason": "max_steps"}))
+        except Exception as e:
+            await queue.put(("error", {"message": str(e), "type": type(e).__name__}))
+        finally:
+            await queue.put(_DONE)
+
+    task = asyncio.create_task(_run())
+    stopped = None
+    try:
+        while True:
+            timeout = heartbeat_interval
+            if deadline is not None:
+                timeout = max(0.0, min(timeout, deadline - loop.time()))
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                if deadline is not None and loop.time() >= deadline:
+                    stopped = "deadline"
+                    break
+                yield ("ping", None)
+                continue
+            if item is _DONE:
+                break
+            if item[0] == "budget":
+                stopped = item[1]["reason"]
+                break
+            yield item
+        if stopped is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # The run may have finished while the budget ran out; prefer its own answer
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is _DONE or item[0] == "budget":
+                continue
+            yield item
+            if item[0] in ("final", "error"):
+                return
+        time_left = deadline - loop.time() if deadline is not None else None
+        result = await partial_answer(agent, query, gathered, stopped, time_left)
+        if agent.memory_enabled:
+            # The query is already in the history; close the turn with the partial answer
+            agent.add_to_history(AIMessage(content=result))
+        yield ("final", {"result": result, "steps": steps, "stopped": stopped})
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def partial_answer(
+    agent: MCPAgent,
+    query: str,
+    gathered: Sequence[Tuple[str, str]],
+    reason: str,
+    time_left: Optional[float],
+) -> str:
+    """
+    Best-effort answer for a run stopped by its budget. When steps ran out and time is
+    left, the LLM answers once more from the tool results without tools; otherwise, or
+    if that fails, the tool results gathered so far are returned as they are.
+    """
+    budget_name = BUDGET_NAMES[reason]
+    results = [(tool, output[:PARTIAL_RESULT_CHARS]) for tool, output in gathered]
+    if reason == "max_steps" and results and (time_left is None or time_left > 0):
+        findings = "\n\n".join(f"{tool} returned:\n{output}" for tool, output in results)
+        try:
+            async with asyncio.timeout(time_left):
+                response = await agent.llm.ainvoke([
+                    SystemMessage(content=PARTIAL_ANSWER_INSTRUCTIONS.format(budget=budget_name)),
+                    HumanMessage(content=f"Question: {query}\n\nTool results so far:\n\n{findings}"),
+                ])
+            answer = str(response.content).strip()
+            if answer:
+                return answer
+        except Exception:
+            pass
+    answer = f"Stopped early: {budget_name} ran out before the answer was complete."
+    if results:
+        answer += "\n\nResults gathered so far:\n" + "\n".join(f"- {tool}: {output}" for tool, output in results)
+    return answer
+
+
+async def run_agent(agent: MCPAgent, query: str, budget: Optional[RunBudget] = None) -> Tuple[str, Optional[str]]:
+    """
+    Run the agent to completion like MCPAgent.run() and return (result, stopped), where
+    stopped names the budget that ended the run early, if any.
+    """
+    if not budget:
+        return await agent.run(query, manage_connector=False), None
+    async for event, data in stream_agent_run(agent, query, budget=budget):
+        if event == "final":
+            return data["result"], data.get("stopped")
+        if event == "error":
+            raise RuntimeError(data["message"])
+    raise RuntimeError("Agent run ended without a result")
+
+
+async def fan_out(
+    items: Sequence[T],
+    concurrency: int,
+    run_one: Callable[[int, int, T], Awaitable[R]],
+) -> AsyncIterator[Tuple[int, Optional[R], Optional[BaseException]]]:
+    """
+    Call run_one(worker, index, item) for every item with at most `concurrency` calls in
+    flight and yield (index, result, error) in completion order. `worker` identifies the
+    calling worker, so callers can keep per-worker state such as an agent.
+    Outstanding calls are cancelled if the consumer stops iterating.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    pending = iter(enumerate(items))
+
+    async def _worker(worker: int) -> None:
+        for index, item in pending:
+            try:
+                result = await run_one(worker, index, item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await queue.put((index, None, e))
+            else:
+                await queue.put((index, result, None))
+
+    workers = [asyncio.create_task(_worker(worker)) for worker in range(max(1, min(concurrency, len(items))))]
+    try:
+        for _ in range(len(items)):
+            yield await queue.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def format_sse(event: str, data: Optional[dict]) -> str:
+    """Encode one Server-Sent Events frame; heartbeats are sent as comments."""
+    if event == "ping":
+        return ": ping\n\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -3,31 +3,156 @@ FastAPI backend service for MCP operations.
 This service handles MCP client and agent creation/management.
 Run with: uv run uvicorn backend.backend_service:app --reload --port ${BACKEND_PORT:-8000}
 """
+import asyncio
+import logging
 import os
-import re
 import time
-from typing import Dict, Optional, Any
-from fastapi import FastAPI, HTTPException, Request, status, Request
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Any
+from fastapi import FastAPI, HTTPException, Request, Response, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.exceptions import RequestValidationError
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, Field, ValidationError
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from mcp_use import MCPAgent, MCPClient
+from langchain_core.messages import AIMessage, HumanMessage
+from mcp_use import MCPAgent
 import mcp_use
 import warnings
 
+try:
+    # orjson encodes multi-megabyte results several times faster than the json module
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as JSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse
+
+try:
+    from .activation_plan import ActivationPlan, ActivationPlanCache, ActivationPlanError
+    from .admission import AdmissionController, AdmissionRejected
+    from .agent_runner import RunBudget, fan_out, format_sse, run_agent, stream_agent_run
+    from .client_pool import MCPClientPool, MCPStartupError, ServerStatus
+    from .compression import CompressionMiddleware
+    from .conversation_memory import MemoryPolicy, SessionMemory
+    from .jobs import Job, JobLimitReached, JobRegistry
+    from .llm_clients import LLMClientRegistry
+    from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ServiceMetrics
+    from .model_routing import RoutingChatModel, RoutingPolicy, RoutingStats
+    from .response_cache import create_response_cache, response_cache_key
+    from .run_recorder import RunRecorder
+    from .session_registry import (
+        WORKER_ID,
+        SessionRecord,
+        create_session_registry,
+        deserialize_history,
+        is_newer_elsewhere,
+        serialize_history,
+    )
+    from .session_store import SessionEntry, SessionStore
+    from .text_filters import create_response_rewriter
+    from .tool_cache import ToolResultCache
+    from .tool_catalog import ToolCatalog
+    from .tool_concurrency import ToolConcurrencyLimiter
+    from .tool_selection import ToolSelector
+    from .tracing import create_tracer
+except ImportError:
+    from activation_plan import ActivationPlan, ActivationPlanCache, ActivationPlanError
+    from admission import AdmissionController, AdmissionRejected
+    from agent_runner import RunBudget, fan_out, format_sse, run_agent, stream_agent_run
+    from client_pool import MCPClientPool, MCPStartupError, ServerStatus
+    from compression import CompressionMiddleware
+    from conversation_memory import MemoryPolicy, SessionMemory
+    from jobs import Job, JobLimitReached, JobRegistry
+    from llm_clients import LLMClientRegistry
+    from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ServiceMetrics
+    from model_routing import RoutingChatModel, RoutingPolicy, RoutingStats
+    from response_cache import create_response_cache, response_cache_key
+    from run_recorder import RunRecorder
+    from session_registry import (
+        WORKER_ID,
+        SessionRecord,
+        create_session_registry,
+        deserialize_history,
+        is_newer_elsewhere,
+        serialize_history,
+    )
+    from session_store import SessionEntry, SessionStore
+    from text_filters import create_response_rewriter
+    from tool_cache import ToolResultCache
+    from tool_catalog import ToolCatalog
+    from tool_concurrency import ToolConcurrencyLimiter
+    from tool_selection import ToolSelector
+    from tracing import create_tracer
+
 warnings.filterwarnings("ignore")
 mcp_use.set_debug(0)
 
 # Load environment variables from backend .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+async def reap_idle_resources(interval: float) -> None:
+    """Periodically expire idle sessions and stop idle pooled MCP clients."""
+
+    async def sweep_jobs() -> None:
+        jobs.sweep()
+
+    while True:
+        await asyncio.sleep(interval)
+        # Each sweep runs even if another failed, so one bad eviction cannot leak the rest
+        for name, sweep in (
+            ("sessions", session_store.sweep),
+            ("clients", client_pool.evict_idle),
+            ("jobs", sweep_jobs),
+        ):
+            try:
+                await sweep()
+            except Exception:
+                logger.exception("Idle reaper failed to sweep %s", name)
+                metrics.reaper_errors.inc(sweep=name)
+
+
+async def shutdown_mcp_clients(timeout: float) -> None:
+    """Release all sessions and close every pooled MCP client concurrently within the timeout."""
+    await jobs.close_all()
+    await session_store.close_all()
+    await client_pool.close_all(timeout)
+    if response_cache:
+        await response_cache.close()
+    await llm_clients.close()
+    if session_registry:
+        await session_registry.close()
+    await tracer.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Run the idle reaper, trace exporter and session snapshots while serving and tear down
+    all MCP clients on shutdown.
+    """
+    background = [asyncio.create_task(reap_idle_resources(float(os.getenv("MCP_REAPER_INTERVAL", "30"))))]
+    if session_registry:
+        background.append(asyncio.create_task(session_registry.run()))
+    if tracer.enabled:
+        background.append(asyncio.create_task(tracer.run(float(os.getenv("MCP_TRACING_EXPORT_INTERVAL", "5")))))
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await shutdown_mcp_clients(float(os.getenv("MCP_SHUTDOWN_TIMEOUT", "10")))
+
+
 app = FastAPI(
     title="MCP Backend Service",
     description="FastAPI backend for MCP-powered AI Assistant",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=JSONResponse
 )
 
 # Enable CORS for Next.js frontend
@@ -42,6 +167,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses for clients that accept brotli or gzip
+if os.getenv("MCP_COMPRESSION", "true").lower() in ("1", "true", "yes"):
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("MCP_COMPRESSION_MIN_SIZE", "1024")),
+        gzip_level=int(os.getenv("MCP_COMPRESSION_GZIP_LEVEL", "6")),
+        brotli_quality=int(os.getenv("MCP_COMPRESSION_BROTLI_QUALITY", "4")),
+    )
+
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -62,7 +196,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
             message="Validation error",
             path=str(request.url.path),
             data={"errors": errors}
-        ).dict()
+        ).model_dump()
     )
 
 
@@ -77,13 +211,14 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             message=exc.detail,
             path=str(request.url.path),
             data=None
-        ).dict()
+        ).model_dump()
     )
 
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Convert all other exceptions to standardized format."""
+    metrics.record_error(request.url.path, exc)
     return JSONResponse(
         status_code=500,
         content=StandardResponse(
@@ -92,12 +227,385 @@ async def general_exception_handler(request: Request, exc: Exception):
             message=str(exc),
             path=str(request.url.path),
             data=None
-        ).dict()
+        ).model_dump()
+    )
+
+metrics = ServiceMetrics()
+
+# Spans per query, agent step, LLM call and MCP tool call, exported as OTLP/JSON
+tracer = create_tracer(
+    mode=os.getenv("MCP_TRACING", "off"),
+    file_path=os.getenv("MCP_TRACING_FILE", "traces.jsonl"),
+    otlp_endpoint=os.getenv("MCP_TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"),
+    otlp_headers=os.getenv("MCP_TRACING_OTLP_HEADERS", ""),
+    service_name=os.getenv("MCP_TRACING_SERVICE_NAME", "mcp-backend"),
+)
+
+# Opt-in JSONL recordings of query runs, replayable offline with benchmarks/replay_recording.py
+recorder = RunRecorder(
+    directory=os.getenv("MCP_RECORD_DIR", ""),
+    sample_rate=float(os.getenv("MCP_RECORD_SAMPLE_RATE", "1.0")),
+)
+
+# Results of tools allowlisted via "cacheTools" in a server's config, shared across runs
+tool_result_cache = ToolResultCache(max_entries=int(os.getenv("MCP_TOOL_CACHE_MAX_ENTRIES", "1000")))
+
+# Tool calls of one step run concurrently, at most MCP_SERVER_MAX_CONCURRENCY per server
+tool_limiter = ToolConcurrencyLimiter(
+    max_per_server=int(os.getenv("MCP_SERVER_MAX_CONCURRENCY", "4")),
+    parallel=os.getenv("MCP_PARALLEL_TOOL_CALLS", "true").lower() in ("1", "true", "yes"),
+)
+
+
+def tool_interceptors(server_name: str, server_config: Dict[str, Any]) -> list:
+    """Interceptors wrapped around every MCP tool call of a server, outermost first."""
+    interceptors = []
+    if tracer.enabled:
+        # Outermost, so cache hits show up as (fast) tool spans too
+        interceptors.append(tracer.trace_tool_call)
+    if recorder.enabled:
+        # Records what the agent saw, cache hits included, so replays match the run
+        interceptors.append(recorder.record_tool_call)
+    cache_interceptor = tool_result_cache.interceptor_for(server_config)
+    if cache_interceptor:
+        interceptors.append(cache_interceptor)
+    # Inside the cache, so cache hits never wait for a slot
+    limit_interceptor = tool_limiter.interceptor_for(server_config)
+    if limit_interceptor:
+        interceptors.append(limit_interceptor)
+    # Innermost, so cache hits are not counted as server time
+    interceptors.append(metrics.time_tool_call)
+    return interceptors
+
+
+# Tool schemas per server build, persisted so warm activations skip discovery
+tool_catalog_path = os.getenv("MCP_TOOL_CATALOG_PATH", "")
+tool_catalog = ToolCatalog(
+    path=tool_catalog_path,
+    ttl=float(os.getenv("MCP_TOOL_CATALOG_TTL", "604800")),
+) if tool_catalog_path else None
+
+# Runs with only the top-k tools matching the query (0 sends every tool)
+tool_selector = ToolSelector(top_k=int(os.getenv("MCP_TOOL_TOP_K", "0")))
+
+# Validated configs with ${VAR} placeholders resolved, cached by config hash
+activation_plans = ActivationPlanCache(max_entries=int(os.getenv("MCP_ACTIVATION_PLAN_CACHE_SIZE", "256")))
+
+# MCP clients are shared between sessions with identical server configs
+client_pool = MCPClientPool(
+    idle_ttl=float(os.getenv("MCP_POOL_IDLE_TTL", "300")),
+    close_timeout=float(os.getenv("MCP_SHUTDOWN_TIMEOUT", "10")),
+    interceptor_factory=tool_interceptors,
+    start_timeout=float(os.getenv("MCP_SERVER_START_TIMEOUT", "60")),
+    catalog=tool_catalog,
+    notify_cancelled=os.getenv("MCP_NOTIFY_CANCELLED", "false").lower() in ("1", "true", "yes"),
+)
+
+# Long-running queries submitted through /api/mcp/jobs
+jobs = JobRegistry(
+    max_jobs=int(os.getenv("MCP_MAX_JOBS", "100")),
+    ttl=float(os.getenv("MCP_JOB_TTL", "3600")),
+    abandon_after=float(os.getenv("MCP_JOB_ABANDON_TIMEOUT", "300")),
+)
+
+# Conversation memory policy for sessions that do not send their own
+default_memory_policy = MemoryPolicy(
+    strategy=os.getenv("MCP_MEMORY_STRATEGY", "full"),
+    maxTokens=int(os.getenv("MCP_MEMORY_MAX_TOKENS", "4000")),
+    offloadTokens=int(os.getenv("MCP_MEMORY_OFFLOAD_TOKENS", "0")),
+)
+
+# Model tiers for sessions that do not send their own routing policy; routing is off
+# unless a planner model is configured
+default_routing_policy = RoutingPolicy(
+    plannerModel=os.getenv("LLM_PLANNER_MODEL") or None,
+    finalModel=os.getenv("LLM_FINAL_MODEL") or None,
+    escalateAfterErrors=int(os.getenv("LLM_ESCALATE_AFTER_ERRORS", "2")),
+)
+routing_stats = RoutingStats()
+
+# Start every MCP server during activation instead of on the first query
+EAGER_START = os.getenv("MCP_EAGER_START", "false").lower() in ("1", "true", "yes")
+
+
+async def release_session(entry: SessionEntry, reason: str) -> None:
+    """
+    Give a session's reference on its pooled MCP client back to the pool.
+    Explicitly cleared sessions close the client right away if nothing else uses it.
+    """
+    await client_pool.release(entry.fingerprint, close_if_unused=(reason == "removed"))
+
+
+# Live agents and clients of this worker; see session_registry for sharing sessions across workers
+session_store = SessionStore(
+    idle_ttl=float(os.getenv("MCP_SESSION_IDLE_TTL", "1800")),
+    max_sessions=int(os.getenv("MCP_MAX_SESSIONS", "500")),
+    memory_budget=int(float(os.getenv("MCP_SESSION_MEMORY_BUDGET_MB", "64")) * 1024 * 1024),
+    on_evict=release_session,
+)
+
+# Bounds how many agent runs execute at once and how many may queue for a slot
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("MCP_MAX_CONCURRENT_QUERIES", "32")),
+    max_queue=int(os.getenv("MCP_QUERY_QUEUE_DEPTH", "64")),
+    queue_timeout=float(os.getenv("MCP_QUERY_QUEUE_TIMEOUT", "30")),
+)
+
+# Optional registry that lets any worker rebuild a session activated on another one
+session_registry = create_session_registry(
+    backend=os.getenv("MCP_SESSION_REGISTRY", "off"),
+    ttl=float(os.getenv("MCP_SESSION_REGISTRY_TTL", "86400")),
+    max_entries=int(os.getenv("MCP_SESSION_REGISTRY_MAX_ENTRIES", "10000")),
+    redis_url=os.getenv("MCP_SESSION_REGISTRY_REDIS_URL", "redis://localhost:6379/0"),
+    sqlite_path=os.getenv("MCP_SESSION_REGISTRY_PATH", "sessions.db"),
+    flush_interval=float(os.getenv("MCP_SESSION_SNAPSHOT_INTERVAL", "5")),
+)
+# Rebuilds in progress, so concurrent requests for the same session share one
+session_rebuilds: Dict[str, asyncio.Future] = {}
+
+metrics.gauge("mcp_active_sessions", "Sessions held in the session store.", lambda: len(session_store))
+metrics.gauge("mcp_pooled_clients", "MCP clients in the client pool.", lambda: client_pool.stats()["clients"])
+metrics.gauge("mcp_live_servers", "Running MCP server sessions (stdio subprocesses or remote connections).", client_pool.live_servers)
+metrics.gauge("mcp_queries_running", "Agent runs holding an admission slot.", lambda: admission.running)
+metrics.gauge("mcp_queries_waiting", "Agent runs waiting for their session or an admission slot.", lambda: admission.waiting)
+
+# Optional cache of final answers, keyed by config fingerprint, model and normalized query
+response_cache = create_response_cache(
+    backend=os.getenv("MCP_RESPONSE_CACHE", "off"),
+    ttl=float(os.getenv("MCP_RESPONSE_CACHE_TTL", "600")),
+    max_entries=int(os.getenv("MCP_RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+    redis_url=os.getenv("MCP_RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0"),
+)
+
+# Chat models are shared per (model, base_url) and use one keep-alive connection pool
+llm_clients = LLMClientRegistry(
+    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+    keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+    http2=os.getenv("LLM_HTTP2", "false").lower() == "true",
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+    retry_backoff=float(os.getenv("LLM_RETRY_BACKOFF", "0.5")),
+    retry_max_wait=float(os.getenv("LLM_RETRY_MAX_WAIT", "30")),
+)
+
+
+def response_cache_mode(req: Request) -> str:
+    """
+    Read the client's cache preference from the request headers.
+    Returns 'use', 'refresh' (Cache-Control: no-cache: skip lookup but store the answer)
+    or 'bypass' (Cache-Control: no-store or X-MCP-Cache: bypass).
+    """
+    cache_control = req.headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or req.headers.get("x-mcp-cache", "").lower() == "bypass":
+        return "bypass"
+    if "no-cache" in cache_control:
+        return "refresh"
+    return "use"
+
+
+def cacheable_query_key(session: SessionEntry, query: str, mode: str) -> Optional[str]:
+    """
+    Return the response cache key for a query, or None if it must not be cached.
+    Only the first turn of a conversation is cached: later answers can depend on history.
+    """
+    if response_cache is None or mode == "bypass":
+        return None
+    if any(isinstance(message, HumanMessage) for message in session.agent.get_conversation_history()):
+        return None
+    return response_cache_key(session.fingerprint, session.model, query)
+
+
+async def create_session_entry(
+    session_id: str,
+    raw_config: Dict[str, Any],
+    history: Optional[list] = None,
+    plan: Optional[ActivationPlan] = None,
+    memory_policy: Optional[MemoryPolicy] = None,
+    routing_policy: Optional[RoutingPolicy] = None,
+) -> SessionEntry:
+    """Build an agent for a config on a pooled MCP client, optionally restoring its history."""
+    plan = plan or activation_plans.get_plan(raw_config)
+    api_key = os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
+    llm_model = os.getenv("LLM_MODEL", "openai/gpt-4o-mini")
+    llm_base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+    max_steps = int(os.getenv("MCP_MAX_STEPS", "100"))
+
+    # Both routing tiers are clients from the shared registry
+    routing = routing_policy or default_routing_policy
+    final_model = routing.finalModel or llm_model
+    llm = llm_clients.get(final_model, llm_base_url, api_key)
+    model_label = final_model
+    if routing.plannerModel and routing.plannerModel != final_model:
+        llm = RoutingChatModel(
+            planner=llm_clients.get(routing.plannerModel, llm_base_url, api_key),
+            final=llm,
+            planner_model=routing.plannerModel,
+            final_model=final_model,
+            escalate_after_errors=routing.escalateAfterErrors,
+            routing_stats=routing_stats,
+        )
+        # Distinct label so metrics and cached answers are kept apart from single-model sessions
+        model_label = f"{routing.plannerModel}>{final_model}"
+
+    # Reuse a pooled MCP client for identical server configs
+    pooled = await client_pool.acquire(plan.config, plan.fingerprint)
+    client = pooled.client
+
+    # Create agent; the pool owns the client lifecycle, not the agent
+    agent = MCPAgent(llm=llm, client=client, max_steps=max_steps, auto_initialize=True)
+    for message in history or []:
+        agent.add_to_history(message)
+
+    return SessionEntry(
+        session_id=session_id,
+        agent=agent,
+        client=client,
+        fingerprint=pooled.fingerprint,
+        model=model_label,
+        config=raw_config,
+        memory=SessionMemory(memory_policy or default_memory_policy),
+        routing=routing_policy,
+    )
+
+
+async def rebuild_session(record: SessionRecord) -> SessionEntry:
+    """Recreate a session from its registry record on this worker and take ownership of it."""
+    entry = await create_session_entry(
+        record.session_id,
+        record.config,
+        deserialize_history(record.history),
+        memory_policy=MemoryPolicy.model_validate(record.memory) if record.memory else None,
+        routing_policy=RoutingPolicy.model_validate(record.routing) if record.routing else None,
+    )
+    entry.synced_at = record.updated_at
+    await session_store.put(entry)
+    session_registry.rebuilds += 1
+    await persist_session(entry)
+    return entry
+
+
+async def load_session(session_id: str) -> Optional[SessionEntry]:
+    """
+    Return a live session, rebuilding it from the registry if this worker does not hold it
+    or holds a copy that is behind turns another worker has served since.
+    """
+    session = await session_store.get(session_id)
+    if not session_registry:
+        return session
+    pending = session_rebuilds.get(session_id)
+    if pending is None:
+        try:
+            record = await session_registry.get(session_id)
+        except Exception as e:
+            if session is None:
+                raise
+            # The local copy can still answer while the registry is unreachable
+            metrics.record_error("session_registry", e)
+            return session
+        if record is None or (session is not None and not is_newer_elsewhere(record, session.synced_at)):
+            return session
+        pending = session_rebuilds.get(session_id)
+        if pending is None:
+            pending = asyncio.ensure_future(rebuild_session(record))
+            session_rebuilds[session_id] = pending
+            pending.add_done_callback(lambda _: session_rebuilds.pop(session_id, None))
+    return await asyncio.shield(pending)
+
+
+async def finish_turn(session: SessionEntry) -> None:
+    """Apply the session's memory policy to its history, then persist it."""
+    if session.memory:
+        await session.memory.apply(session.agent)
+    await persist_session(session)
+
+
+async def run_job(job: Job, session: SessionEntry, budget: RunBudget) -> str:
+    """Run a job's query as a turn of its session, recording steps and tool calls as they happen."""
+    result = None
+    trace = tracer.trace_request("mcp.job", session.model, {
+        "mcp.endpoint": "job",
+        "mcp.session_id": session.session_id,
+        "mcp.job_id": job.job_id,
+        "mcp.query.bytes": len(job.query.encode("utf-8")),
+    })
+    with metrics.track_query("job", session.model), trace as span:
+        # Admitted before waiting on the session, so the wait counts against the queue
+        async with admission.slot(session.lock):
+            await client_pool.ensure_sessions(session.fingerprint)
+            job.mark_running()
+            async with tool_selector.restrict(session.agent, job.query), tool_limiter.run_scope():
+                async for event, data in stream_agent_run(session.agent, job.query, budget=budget):
+                    if event == "final":
+                        result = data["result"]
+                        job.stop_reason = data.get("stopped")
+                        record_budget_stop("job", job.stop_reason)
+                        span.set_attribute("mcp.stop_reason", job.stop_reason)
+                    elif event == "error":
+                        raise RuntimeError(data["message"])
+                    else:
+                        job.record_event(event, data)
+            await finish_turn(session)
+    return filter_negative_messages(result)
+
+
+async def persist_session(session: SessionEntry, replace: bool = False) -> None:
+    """
+    Write a session's config and history to the registry, marking this worker as owner.
+    The write is skipped if another worker stored a newer turn since this copy was synced,
+    so a stale copy never overwrites it; the next query rebuilds from the newer record.
+    replace writes unconditionally, for a (re)activation.
+    """
+    if not session_registry:
+        return
+    record = SessionRecord(
+        session_id=session.session_id,
+        config=session.config,
+        model=session.model,
+        history=serialize_history(session.agent.get_conversation_history()),
+        memory=session.memory.policy.model_dump() if session.memory else None,
+        routing=session.routing.model_dump() if session.routing else None,
+    )
+    try:
+        if not replace:
+            current = await session_registry.get(session.session_id)
+            if current is not None and is_newer_elsewhere(current, session.synced_at):
+                session_registry.conflicts += 1
+                return
+        await session_registry.put(record)
+        session.synced_at = record.updated_at
+    except Exception as e:
+        # The answer is already computed; a registry outage only costs failover
+        metrics.record_error("session_registry", e)
+
+
+def record_cached_turn(session: SessionEntry, query: str, result: str) -> None:
+    """Add a cache-served exchange to the session history as if the agent had run it."""
+    session.agent.add_to_history(HumanMessage(content=query))
+    session.agent.add_to_history(AIMessage(content=result))
+
+
+def is_cacheable_result(result: str) -> bool:
+    """Agent failures are returned as text; never cache them."""
+    return bool(result) and not result.startswith("Agent stopped")
+
+
+def admission_rejected_response(exc: AdmissionRejected, req: Request) -> JSONResponse:
+    """Standardized 429/503 response for runs that could not be admitted."""
+    return JSONResponse(
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+        content=StandardResponse(
+            status_code=exc.status_code,
+            status=False,
+            message=str(exc),
+            path=str(req.url.path),
+            data=None
+        ).model_dump()
     )
 
-# Store active agents and clients in memory (in production, use Redis or similar)
-active_agents: Dict[str, MCPAgent] = {}
-active_clients: Dict[str, MCPClient] = {}
+
+# Rewrites negative phrasing in answers; the rule table can be replaced with a JSON file
+response_rewriter = create_response_rewriter(os.getenv("MCP_REWRITE_RULES_FILE") or None)
 
 
 def filter_negative_messages(text: str) -> str:
@@ -107,36 +615,7 @@ def filter_negative_messages(text: str) -> str:
     """
     if not text:
         return text
-    
-    # Patterns to remove or replace
-    negative_patterns = [
-        (r'returned an error and is not usable', 'is currently unavailable'),
-        (r'returned an error', 'encountered an issue'),
-        (r'is not usable', 'is currently unavailable'),
-        (r'not usable', 'unavailable'),
-        (r'failed to', 'could not'),
-        (r'error occurred', 'issue encountered'),
-        (r'error:', 'note:'),
-        (r'Error:', 'Note:'),
-    ]
-    
-    result = text
-    for pattern, replacement in negative_patterns:
-        result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
-    
-    # Remove sentences that are too negative
-    sentences = result.split('.')
-    filtered_sentences = []
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if sentence:
-            # Skip sentences that are purely about errors/not usable
-            lower_sentence = sentence.lower()
-            if not (('error' in lower_sentence and 'not usable' in lower_sentence) or
-                    ('returned an error' in lower_sentence and 'not usable' in lower_sentence)):
-                filtered_sentences.append(sentence)
-    
-    return '. '.join(filtered_sentences).strip()
+    return response_rewriter.rewrite(text)
 
 
 class StandardResponse(BaseModel):
@@ -162,11 +641,55 @@ class StandardResponse(BaseModel):
 class MCPConfigRequest(BaseModel):
     config: dict
     sessionId: Optional[str] = None
+    # Start the servers during activation and report their readiness; defaults to MCP_EAGER_START
+    eager: Optional[bool] = None
+    # Conversation memory policy; defaults to the MCP_MEMORY_* settings
+    memory: Optional[MemoryPolicy] = None
+    # Planner/final model tiers; defaults to the LLM_PLANNER_MODEL settings
+    routing: Optional[RoutingPolicy] = None
 
 
 class QueryRequest(BaseModel):
     query: str
     sessionId: str
+    # Optional budgets for this query; when one runs out the agent stops and answers
+    # with what it has gathered. A step is one LLM turn, however many tools it calls in
+    # parallel, as MCP_MAX_STEPS counts them; that limit still applies.
+    maxSteps: Optional[int] = Field(default=None, ge=1)
+    maxTokens: Optional[int] = Field(default=None, ge=1)
+    deadlineMs: Optional[int] = Field(default=None, ge=1)
+
+
+def query_budget(request: QueryRequest) -> RunBudget:
+    return RunBudget(max_steps=request.maxSteps, max_tokens=request.maxTokens, deadline_ms=request.deadlineMs)
+
+
+def record_budget_stop(endpoint: str, reason: Optional[str]) -> None:
+    if reason:
+        metrics.budget_stops.inc(endpoint=endpoint, reason=reason)
+
+
+BATCH_MAX_QUERIES = int(os.getenv("MCP_BATCH_MAX_QUERIES", "1000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("MCP_BATCH_MAX_CONCURRENCY", "16"))
+# The default may not exceed what a request is allowed to ask for
+BATCH_CONCURRENCY = max(min(int(os.getenv("MCP_BATCH_CONCURRENCY", "4")), BATCH_MAX_CONCURRENCY), 1)
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=BATCH_MAX_QUERIES)
+    sessionId: str
+    # Queries run at once; defaults to MCP_BATCH_CONCURRENCY
+    concurrency: Optional[int] = Field(default=None, ge=1, le=BATCH_MAX_CONCURRENCY)
+
+
+class ServerReadiness(BaseModel):
+    """Startup outcome of one MCP server"""
+    name: str
+    ready: bool
+    startupMs: Optional[float] = None
+    tools: int = 0
+    toolsCached: bool = False
+    error: Optional[str] = None
 
 
 class ActivateResponseData(BaseModel):
@@ -174,11 +697,46 @@ class ActivateResponseData(BaseModel):
     sessionId: str
     servers: list[str]
     message: str
+    readiness: Optional[list[ServerReadiness]] = None
+    memory: Optional[MemoryPolicy] = None
+    routing: Optional[RoutingPolicy] = None
+
+
+def server_readiness(statuses: Dict[str, ServerStatus]) -> list[ServerReadiness]:
+    return [
+        ServerReadiness(
+            name=status.name,
+            ready=status.ready,
+            startupMs=round(status.startup_seconds * 1000, 1) if status.startup_seconds is not None else None,
+            tools=status.tools,
+            toolsCached=status.cached,
+            error=status.error,
+        )
+        for status in statuses.values()
+    ]
 
 
 class QueryResponseData(BaseModel):
     """Response data for query endpoint"""
     result: str
+    # Budget that stopped the run early (max_steps, max_tokens or deadline); result is then partial
+    stopReason: Optional[str] = None
+
+
+class BatchItemResponseData(BaseModel):
+    """Response data for one query of a batch"""
+    index: int
+    query: str
+    result: Optional[str] = None
+    cached: bool = False
+
+
+class BatchSummaryResponseData(BaseModel):
+    """Response data for the last line of a batch"""
+    total: int
+    succeeded: int
+    failed: int
+    durationMs: float
 
 
 class SessionListResponseData(BaseModel):
@@ -187,6 +745,47 @@ class SessionListResponseData(BaseModel):
     count: int
 
 
+class SessionStatsResponseData(BaseModel):
+    """Response data for session stats endpoint"""
+    sessions: dict
+    pool: dict
+    admission: dict
+    response_cache: Optional[dict] = None
+    tool_cache: Optional[dict] = None
+    tool_catalog: Optional[dict] = None
+    tool_selection: Optional[dict] = None
+    activation_plans: Optional[dict] = None
+    llm: Optional[dict] = None
+    routing: Optional[dict] = None
+    tool_concurrency: Optional[dict] = None
+    jobs: Optional[dict] = None
+    tracing: Optional[dict] = None
+    recorder: Optional[dict] = None
+    registry: Optional[dict] = None
+
+
+class OffloadedContentResponseData(BaseModel):
+    """Response data for offloaded message content"""
+    ref: str
+    content: str
+
+
+class JobResponseData(BaseModel):
+    """Response data for job endpoints"""
+    jobId: str
+    sessionId: str
+    query: str
+    status: str
+    createdAt: float
+    startedAt: Optional[float] = None
+    finishedAt: Optional[float] = None
+    steps: int = 0
+    toolCalls: list[dict] = []
+    result: Optional[str] = None
+    stopReason: Optional[str] = None
+    error: Optional[str] = None
+
+
 class SessionClearResponseData(BaseModel):
     """Response data for session clear endpoint"""
     message: str
@@ -202,26 +801,6 @@ class ValidationErrorData(BaseModel):
     errors: list[dict]
 
 
-def substitute_env_vars(value: Any) -> Any:
-    """Recursively substitute environment variables in config values."""
-    if isinstance(value, dict):
-        return {k: substitute_env_vars(v) for k, v in value.items()}
-    elif isinstance(value, list):
-        return [substitute_env_vars(item) for item in value]
-    elif isinstance(value, str):
-        # Match ${VAR_NAME} pattern
-        pattern = r'\$\{([^}]+)\}'
-        def replace_env(match):
-            var_name = match.group(1)
-            env_value = os.getenv(var_name)
-            if env_value is None:
-                raise ValueError(f"Environment variable {var_name} not found")
-            return env_value
-        return re.sub(pattern, replace_env, value)
-    else:
-        return value
-
-
 @app.post(
     "/api/mcp/activate",
     response_model=StandardResponse,
@@ -250,6 +829,54 @@ def substitute_env_vars(value: Any) -> Any:
                 }
             }
         },
+        400: {
+            "model": StandardResponse,
+            "description": "Invalid Configuration",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 400,
+                        "status": False,
+                        "message": "Missing environment variables: FIRECRAWL_API_KEY",
+                        "path": "/api/mcp/activate",
+                        "data": {
+                            "errors": [
+                                {
+                                    "field": "mcpServers.mcp-server-firecrawl.env.FIRECRAWL_API_KEY",
+                                    "message": "Environment variable FIRECRAWL_API_KEY not found",
+                                    "type": "env_var.missing"
+                                }
+                            ]
+                        }
+                    }
+                }
+            }
+        },
+        502: {
+            "model": StandardResponse,
+            "description": "MCP Servers Failed To Start (eager mode)",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 502,
+                        "status": False,
+                        "message": "No MCP server could be started.",
+                        "path": "/api/mcp/activate",
+                        "data": {
+                            "readiness": [
+                                {
+                                    "name": "mcp-server-firecrawl",
+                                    "ready": False,
+                                    "startupMs": 60000.0,
+                                    "tools": 0,
+                                    "error": "Timed out after 60s"
+                                }
+                            ]
+                        }
+                    }
+                }
+            }
+        },
         500: {
             "model": StandardResponse,
             "description": "Internal Server Error",
@@ -267,8 +894,9 @@ def substitute_env_vars(value: Any) -> Any:
         }
     }
 )
-async def activate_mcp_config(request: MCPConfigRequest, req: Request):
+async def activate_mcp_config(request: MCPConfigRequest, req: Request, response: Response):
     """Activate MCP configuration and create agent."""
+    started = time.perf_counter()
     try:
         config = request.config
         if not config or "mcpServers" not in config:
@@ -280,14 +908,24 @@ async def activate_mcp_config(request: MCPConfigRequest, req: Request):
                     message="Invalid configuration. mcpServers is required.",
                     path=str(req.url.path),
                     data=None
-                ).dict()
+                ).model_dump()
             )
 
-        # Substitute environment variables in config
-        config = substitute_env_vars(config)
-
-        # Create MCP client
-        client = MCPClient.from_dict(config)
+        # Validate and resolve ${VAR} placeholders before any server is started
+        try:
+            plan = activation_plans.get_plan(config)
+        except ActivationPlanError as e:
+            metrics.activation_duration.observe(time.perf_counter() - started, outcome="invalid")
+            return JSONResponse(
+                status_code=400,
+                content=StandardResponse(
+                    status_code=400,
+                    status=False,
+                    message=str(e),
+                    path=str(req.url.path),
+                    data=ValidationErrorData(errors=e.errors).model_dump()
+                ).model_dump()
+            )
 
         # Create LLM
         api_key = os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
@@ -300,44 +938,68 @@ async def activate_mcp_config(request: MCPConfigRequest, req: Request):
                     message="Missing OPENROUTER_API_KEY or OPENAI_API_KEY in environment.",
                     path=str(req.url.path),
                     data=None
-                ).dict()
+                ).model_dump()
             )
 
-        llm_model = os.getenv("LLM_MODEL", "openai/gpt-4o-mini")
-        llm_base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
-        max_steps = int(os.getenv("MCP_MAX_STEPS", "100"))
-
-        llm = ChatOpenAI(
-            model=llm_model,
-            api_key=api_key,
-            base_url=llm_base_url,
-        )
-
-        # Create agent
-        agent = MCPAgent(llm=llm, client=client, max_steps=max_steps)
-
         # Store agent and client with session ID
         session_id = request.sessionId or f"session-{int(time.time() * 1000)}"
-        active_agents[session_id] = agent
-        active_clients[session_id] = client
+        entry = await create_session_entry(session_id, config, plan=plan, memory_policy=request.memory, routing_policy=request.routing)
 
-        # Get available tools
-        server_names = list(config["mcpServers"].keys())
+        # In eager mode start all servers now; servers that fail are reported and left out
+        readiness = None
+        message = "Configuration activated successfully!"
+        eager = EAGER_START if request.eager is None else request.eager
+        if eager:
+            trace = tracer.trace_request("mcp.activate", entry.model, {
+                "mcp.session_id": session_id,
+                "mcp.servers": len(plan.server_names),
+            }, req.headers.get("traceparent"))
+            try:
+                with trace:
+                    statuses = await client_pool.ensure_sessions(entry.fingerprint)
+            except MCPStartupError as e:
+                await client_pool.release(entry.fingerprint, close_if_unused=True)
+                metrics.activation_duration.observe(time.perf_counter() - started, outcome="error")
+                metrics.record_error(req.url.path, e)
+                return JSONResponse(
+                    status_code=502,
+                    content=StandardResponse(
+                        status_code=502,
+                        status=False,
+                        message="No MCP server could be started.",
+                        path=str(req.url.path),
+                        data={"readiness": [item.model_dump() for item in server_readiness(e.statuses)]}
+                    ).model_dump()
+                )
+            readiness = server_readiness(statuses)
+            ready_count = sum(1 for item in readiness if item.ready)
+            if ready_count < len(readiness):
+                message = f"Configuration activated with {ready_count} of {len(readiness)} servers ready."
+
+        await session_store.put(entry)
+        await persist_session(entry, replace=True)
+        response.headers["X-MCP-Session-Owner"] = WORKER_ID
 
         response_data = ActivateResponseData(
             sessionId=session_id,
-            servers=server_names,
-            message="Configuration activated successfully!"
+            servers=plan.server_names,
+            message=message,
+            readiness=readiness,
+            memory=entry.memory.policy,
+            routing=entry.routing or default_routing_policy
         )
+        metrics.activation_duration.observe(time.perf_counter() - started, outcome="ok")
 
         return StandardResponse(
             status_code=200,
             status=True,
-            message="Configuration activated successfully!",
+            message=message,
             path=str(req.url.path),
             data=response_data
         )
     except Exception as e:
+        metrics.activation_duration.observe(time.perf_counter() - started, outcome="error")
+        metrics.record_error(req.url.path, e)
         return JSONResponse(
             status_code=500,
             content=StandardResponse(
@@ -346,7 +1008,7 @@ async def activate_mcp_config(request: MCPConfigRequest, req: Request):
                 message=str(e),
                 path=str(req.url.path),
                 data=None
-            ).dict()
+            ).model_dump()
         )
 
 
@@ -385,6 +1047,36 @@ async def activate_mcp_config(request: MCPConfigRequest, req: Request):
                 }
             }
         },
+        429: {
+            "model": StandardResponse,
+            "description": "Too Many Requests",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 429,
+                        "status": False,
+                        "message": "Server is busy. Too many queries are queued, please retry shortly.",
+                        "path": "/api/mcp/query",
+                        "data": None
+                    }
+                }
+            }
+        },
+        503: {
+            "model": StandardResponse,
+            "description": "Service Unavailable",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 503,
+                        "status": False,
+                        "message": "Server is busy. Timed out waiting for a free query slot.",
+                        "path": "/api/mcp/query",
+                        "data": None
+                    }
+                }
+            }
+        },
         422: {
             "model": StandardResponse,
             "description": "Validation Error",
@@ -425,7 +1117,7 @@ async def activate_mcp_config(request: MCPConfigRequest, req: Request):
         }
     }
 )
-async def run_mcp_query(request: QueryRequest, req: Request):
+async def run_mcp_query(request: QueryRequest, req: Request, response: Response):
     """Run a query through the MCP agent."""
     try:
         if not request.query:
@@ -437,7 +1129,7 @@ async def run_mcp_query(request: QueryRequest, req: Request):
                     message="Query is required",
                     path=str(req.url.path),
                     data=None
-                ).dict()
+                ).model_dump()
             )
 
         if not request.sessionId:
@@ -449,11 +1141,11 @@ async def run_mcp_query(request: QueryRequest, req: Request):
                     message="Session ID is required. Please activate configuration first.",
                     path=str(req.url.path),
                     data=None
-                ).dict()
+                ).model_dump()
             )
 
-        agent = active_agents.get(request.sessionId)
-        if not agent:
+        session = await load_session(request.sessionId)
+        if not session:
             return JSONResponse(
                 status_code=404,
                 content=StandardResponse(
@@ -462,25 +1154,79 @@ async def run_mcp_query(request: QueryRequest, req: Request):
                     message="Session not found. Please activate configuration first.",
                     path=str(req.url.path),
                     data=None
-                ).dict()
+                ).model_dump()
             )
 
-        # Run the query
-        result = await agent.run(request.query)
+        cache_mode = response_cache_mode(req)
+        cache_status = "bypass"
+        stop_reason = None
+
+        trace = tracer.trace_request("mcp.query", session.model, {
+            "mcp.endpoint": "query",
+            "mcp.session_id": request.sessionId,
+            "mcp.query.bytes": len(request.query.encode("utf-8")),
+        }, req.headers.get("traceparent"))
+
+        # One run at a time per session; waiting for the session's previous run counts
+        # against the admission queue just like waiting for a free run slot
+        with metrics.track_query("query", session.model), trace as span:
+            async with admission.slot(session.lock):
+                cache_key = cacheable_query_key(session, request.query, cache_mode)
+                result = None
+                if cache_key and cache_mode == "use":
+                    result = await response_cache.get(cache_key)
+                if result is not None:
+                    cache_status = "hit"
+                    record_cached_turn(session, request.query, result)
+                else:
+                    # Start (or reuse) the pooled MCP server sessions, then run the query
+                    await client_pool.ensure_sessions(session.fingerprint)
+                    budget = query_budget(request)
+                    async with (
+                        tool_selector.restrict(session.agent, request.query),
+                        tool_limiter.run_scope(),
+                        recorder.record("query", session.session_id, session.model, request.query, budget) as recording,
+                    ):
+                        result, stop_reason = await run_agent(session.agent, request.query, budget)
+                        if recording:
+                            recording.finish(result, stop_reason)
+                    record_budget_stop("query", stop_reason)
+                    if cache_key:
+                        cache_status = "miss"
+                        # Partial answers are never cached
+                        if stop_reason is None and is_cacheable_result(result):
+                            await response_cache.set(cache_key, result)
+                await finish_turn(session)
+            span.set_attribute("mcp.cache", cache_status)
+            span.set_attribute("mcp.stop_reason", stop_reason)
+            span.set_attribute("mcp.result.bytes", len(result.encode("utf-8")))
+        await session_store.enforce_memory_budget(request.sessionId)
+        response.headers["X-MCP-Session-Owner"] = WORKER_ID
+        if response_cache:
+            response.headers["X-MCP-Cache"] = cache_status
+        if span.trace_id:
+            response.headers["X-MCP-Trace-Id"] = span.trace_id
         
         # Filter negative messages from the result
         filtered_result = filter_negative_messages(result)
 
-        response_data = QueryResponseData(result=filtered_result)
+        response_data = QueryResponseData(result=filtered_result, stopReason=stop_reason)
 
         return StandardResponse(
             status_code=200,
             status=True,
-            message="Query executed successfully",
+            message=(
+                "Query executed successfully" if stop_reason is None
+                else f"Query stopped early ({stop_reason}); the result is partial"
+            ),
             path=str(req.url.path),
             data=response_data
         )
+    except AdmissionRejected as e:
+        metrics.record_error(req.url.path, e)
+        return admission_rejected_response(e, req)
     except Exception as e:
+        metrics.record_error(req.url.path, e)
         return JSONResponse(
             status_code=500,
             content=StandardResponse(
@@ -489,49 +1235,45 @@ async def run_mcp_query(request: QueryRequest, req: Request):
                 message=str(e),
                 path=str(req.url.path),
                 data=None
-            ).dict()
+            ).model_dump()
         )
 
 
-@app.get(
-    "/health",
-    response_model=StandardResponse,
+@app.post(
+    "/api/mcp/query/stream",
     status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
     responses={
-        500: {
+        200: {
+            "description": "Server-Sent Events stream of agent steps and tokens",
+            "content": {
+                "text/event-stream": {
+                    "example": (
+                        "event: tool_start\n"
+                        "data: {\"id\": \"...\", \"tool\": \"firecrawl_scrape\", \"input\": \"...\"}\n\n"
+                        "event: token\n"
+                        "data: {\"text\": \"Hello\"}\n\n"
+                        "event: final\n"
+                        "data: {\"result\": \"Hello!\", \"steps\": 1}\n\n"
+                    )
+                }
+            }
+        },
+        400: {
             "model": StandardResponse,
-            "description": "Internal Server Error",
+            "description": "Bad Request",
             "content": {
                 "application/json": {
                     "example": {
-                        "status_code": 500,
+                        "status_code": 400,
                         "status": False,
-                        "message": "Internal server error",
-                        "path": "/health",
+                        "message": "Query is required",
+                        "path": "/api/mcp/query/stream",
                         "data": None
                     }
                 }
             }
-        }
-    }
-)
-async def health_check(req: Request):
-    """Health check endpoint."""
-    response_data = HealthResponseData(service="MCP Backend Service")
-    return StandardResponse(
-        status_code=200,
-        status=True,
-        message="Service is healthy",
-        path=str(req.url.path),
-        data=response_data
-    )
-
-
-@app.delete(
-    "/api/mcp/session/{session_id}",
-    response_model=StandardResponse,
-    status_code=status.HTTP_200_OK,
-    responses={
+        },
         404: {
             "model": StandardResponse,
             "description": "Not Found",
@@ -540,14 +1282,561 @@ async def health_check(req: Request):
                     "example": {
                         "status_code": 404,
                         "status": False,
-                        "message": "Session not found",
-                        "path": "/api/mcp/session/{session_id}",
+                        "message": "Session not found. Please activate configuration first.",
+                        "path": "/api/mcp/query/stream",
                         "data": None
                     }
                 }
             }
-        },
-        422: {
+        }
+    }
+)
+async def stream_mcp_query(request: QueryRequest, req: Request):
+    """
+    Run a query through the MCP agent and stream its progress as Server-Sent Events.
+    Emits tool_start, tool_end, step, token, final and error events, plus heartbeat comments.
+    """
+    if not request.query:
+        return JSONResponse(
+            status_code=400,
+            content=StandardResponse(
+                status_code=400,
+                status=False,
+                message="Query is required",
+                path=str(req.url.path),
+                data=None
+            ).model_dump()
+        )
+
+    session = await load_session(request.sessionId)
+    if not session:
+        return JSONResponse(
+            status_code=404,
+            content=StandardResponse(
+                status_code=404,
+                status=False,
+                message="Session not found. Please activate configuration first.",
+                path=str(req.url.path),
+                data=None
+            ).model_dump()
+        )
+
+    # Fail fast while we can still answer with a proper status code
+    if admission.is_saturated(session.lock):
+        admission.rejected += 1
+        rejection = AdmissionRejected(
+            "Server is busy. Too many queries are queued, please retry shortly.",
+            status_code=429,
+            retry_after=1,
+        )
+        metrics.record_error(req.url.path, rejection)
+        return admission_rejected_response(rejection, req)
+
+    heartbeat_interval = float(os.getenv("MCP_STREAM_HEARTBEAT", "15"))
+    cache_mode = response_cache_mode(req)
+
+    path = req.url.path
+    traceparent = req.headers.get("traceparent")
+
+    async def event_stream():
+        trace = tracer.trace_request("mcp.query", session.model, {
+            "mcp.endpoint": "stream",
+            "mcp.session_id": request.sessionId,
+            "mcp.query.bytes": len(request.query.encode("utf-8")),
+        }, traceparent)
+        with metrics.track_query("stream", session.model) as run_metrics, trace as span:
+            try:
+                await admission.acquire(session.lock)
+            except AdmissionRejected as e:
+                run_metrics.failed = True
+                metrics.record_error(path, e)
+                yield format_sse("error", {"message": str(e), "status_code": e.status_code})
+                return
+            try:
+                cache_key = cacheable_query_key(session, request.query, cache_mode)
+                if cache_key and cache_mode == "use":
+                    cached = await response_cache.get(cache_key)
+                    if cached is not None:
+                        record_cached_turn(session, request.query, cached)
+                        await finish_turn(session)
+                        span.set_attribute("mcp.cache", "hit")
+                        yield format_sse("final", {
+                            "result": filter_negative_messages(cached),
+                            "steps": 0,
+                            "cached": True,
+                        })
+                        return
+                try:
+                    await client_pool.ensure_sessions(session.fingerprint)
+                except Exception as e:
+                    run_metrics.failed = True
+                    metrics.record_error(path, e)
+                    yield format_sse("error", {"message": str(e)})
+                    return
+                # Tokens of each LLM call are rewritten as they arrive, like the final answer
+                token_rewriter = response_rewriter.stream()
+                async with tool_selector.restrict(session.agent, request.query), tool_limiter.run_scope():
+                    async for event, data in stream_agent_run(
+                        session.agent, request.query, heartbeat_interval, query_budget(request)
+                    ):
+                        if event == "token":
+                            text = token_rewriter.feed(data["text"])
+                            if not text:
+                                continue
+                            data = {"text": text}
+                        elif event in ("step", "final", "error"):
+                            text = token_rewriter.flush()
+                            if text:
+                                yield format_sse("token", {"text": text})
+                            token_rewriter = response_rewriter.stream()
+                        if event == "final":
+                            record_budget_stop("stream", data.get("stopped"))
+                            span.set_attribute("mcp.stop_reason", data.get("stopped"))
+                            span.set_attribute("mcp.result.bytes", len(data["result"].encode("utf-8")))
+                            if cache_key and not data.get("stopped") and is_cacheable_result(data["result"]):
+                                await response_cache.set(cache_key, data["result"])
+                            data = {**data, "result": filter_negative_messages(data["result"])}
+                            await finish_turn(session)
+                        elif event == "error":
+                            run_metrics.failed = True
+                            metrics.errors.inc(path=path, type=data.get("type", "Exception"))
+                            span.record_error(data["message"])
+                        yield format_sse(event, data)
+            finally:
+                admission.release(session.lock)
+        await session_store.enforce_memory_budget(request.sessionId)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-MCP-Session-Owner": WORKER_ID},
+    )
+
+
+@app.post(
+    "/api/mcp/query/batch",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "Newline-delimited JSON: one StandardResponse per query as it completes, then a summary",
+            "content": {
+                "application/x-ndjson": {
+                    "example": (
+                        '{"status_code": 200, "status": true, "message": "Query completed", '
+                        '"path": "/api/mcp/query/batch", "data": {"index": 1, "query": "...", "result": "...", "cached": false}}\n'
+                        '{"status_code": 500, "status": false, "message": "Tool call failed", '
+                        '"path": "/api/mcp/query/batch", "data": {"index": 0, "query": "...", "result": null, "cached": false}}\n'
+                        '{"status_code": 200, "status": true, "message": "Batch completed", '
+                        '"path": "/api/mcp/query/batch", "data": {"total": 2, "succeeded": 1, "failed": 1, "durationMs": 5234.1}}\n'
+                    )
+                }
+            }
+        },
+        404: {
+            "model": StandardResponse,
+            "description": "Not Found",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 404,
+                        "status": False,
+                        "message": "Session not found. Please activate configuration first.",
+                        "path": "/api/mcp/query/batch",
+                        "data": None
+                    }
+                }
+            }
+        },
+        422: {
+            "model": StandardResponse,
+            "description": "Validation Error",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 422,
+                        "status": False,
+                        "message": "Validation error",
+                        "path": "/api/mcp/query/batch",
+                        "data": {
+                            "errors": [
+                                {
+                                    "field": "body.queries",
+                                    "message": "List should have at least 1 item after validation, not 0",
+                                    "type": "too_short"
+                                }
+                            ]
+                        }
+                    }
+                }
+            }
+        }
+    }
+)
+async def batch_mcp_query(request: BatchQueryRequest, req: Request):
+    """
+    Run many independent queries over a session's MCP servers and stream each result
+    as a line of JSON as soon as it completes. Queries run without conversation history
+    on their own agents, which share the session's warm MCP servers and LLM client;
+    the session's own conversation is not touched.
+    """
+    session = await load_session(request.sessionId)
+    if not session:
+        return JSONResponse(
+            status_code=404,
+            content=StandardResponse(
+                status_code=404,
+                status=False,
+                message="Session not found. Please activate configuration first.",
+                path=str(req.url.path),
+                data=None
+            ).model_dump()
+        )
+
+    concurrency = request.concurrency or BATCH_CONCURRENCY
+    cache_mode = response_cache_mode(req)
+    path = req.url.path
+    traceparent = req.headers.get("traceparent")
+
+    async def batch_lines():
+        started = time.perf_counter()
+        succeeded = 0
+        # Hold a reference so the servers stay up even if the session is cleared mid-batch
+        pooled = await client_pool.acquire(session.client.config, session.fingerprint)
+        agents: Dict[int, MCPAgent] = {}
+
+        async def run_one(worker: int, index: int, query: str) -> tuple:
+            cache_key = None
+            if response_cache is not None and cache_mode != "bypass":
+                cache_key = response_cache_key(session.fingerprint, session.model, query)
+            if cache_key and cache_mode == "use":
+                cached = await response_cache.get(cache_key)
+                if cached is not None:
+                    return cached, True
+            agent = agents.get(worker)
+            if agent is None:
+                agent = agents[worker] = MCPAgent(
+                    llm=session.agent.llm,
+                    client=pooled.client,
+                    max_steps=session.agent.max_steps,
+                    auto_initialize=True,
+                    memory_enabled=False,
+                )
+            trace = tracer.trace_request("mcp.query", session.model, {
+                "mcp.endpoint": "batch",
+                "mcp.session_id": session.session_id,
+                "mcp.batch.index": index,
+                "mcp.query.bytes": len(query.encode("utf-8")),
+            }, traceparent)
+            with metrics.track_query("batch", session.model), trace:
+                async with admission.slot(), tool_selector.restrict(agent, query), tool_limiter.run_scope():
+                    await client_pool.ensure_sessions(session.fingerprint)
+                    result = await agent.run(query, manage_connector=False)
+            if cache_key and is_cacheable_result(result):
+                await response_cache.set(cache_key, result)
+            return result, False
+
+        try:
+            async for index, outcome, error in fan_out(request.queries, concurrency, run_one):
+                item = BatchItemResponseData(index=index, query=request.queries[index])
+                if error is None:
+                    succeeded += 1
+                    item.result, item.cached = filter_negative_messages(outcome[0]), outcome[1]
+                    line = StandardResponse(status_code=200, status=True, message="Query completed", path=path, data=item)
+                else:
+                    metrics.record_error(path, error)
+                    status_code = error.status_code if isinstance(error, AdmissionRejected) else 500
+                    line = StandardResponse(status_code=status_code, status=False, message=str(error), path=path, data=item)
+                yield line.model_dump_json() + "\n"
+            summary = BatchSummaryResponseData(
+                total=len(request.queries),
+                succeeded=succeeded,
+                failed=len(request.queries) - succeeded,
+                durationMs=round((time.perf_counter() - started) * 1000, 1),
+            )
+            yield StandardResponse(status_code=200, status=True, message="Batch completed", path=path, data=summary).model_dump_json() + "\n"
+        finally:
+            await client_pool.release(pooled.fingerprint)
+
+    return StreamingResponse(
+        batch_lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-MCP-Session-Owner": WORKER_ID},
+    )
+
+
+@app.post(
+    "/api/mcp/jobs",
+    response_model=StandardResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        202: {
+            "model": StandardResponse,
+            "description": "Job accepted",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 202,
+                        "status": True,
+                        "message": "Job accepted",
+                        "path": "/api/mcp/jobs",
+                        "data": {
+                            "jobId": "job-4f1c2a9e0b7d4c3e8a6f5b2d1c0e9f8a",
+                            "sessionId": "session-1234567890",
+                            "query": "Scrape https://example.com and summarize it",
+                            "status": "running",
+                            "createdAt": 1767225600.0,
+                            "startedAt": 1767225600.1,
+                            "finishedAt": None,
+                            "steps": 1,
+                            "toolCalls": [
+                                {
+                                    "id": "1b7e...",
+                                    "tool": "firecrawl_scrape",
+                                    "input": "{'url': 'https://example.com'}",
+                                    "status": "running"
+                                }
+                            ],
+                            "result": None,
+                            "error": None
+                        }
+                    }
+                }
+            }
+        },
+        404: {
+            "model": StandardResponse,
+            "description": "Not Found",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 404,
+                        "status": False,
+                        "message": "Session not found. Please activate configuration first.",
+                        "path": "/api/mcp/jobs",
+                        "data": None
+                    }
+                }
+            }
+        },
+        429: {
+            "model": StandardResponse,
+            "description": "Too Many Requests",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 429,
+                        "status": False,
+                        "message": "Too many jobs are running, please retry later.",
+                        "path": "/api/mcp/jobs",
+                        "data": None
+                    }
+                }
+            }
+        }
+    }
+)
+async def submit_job(request: QueryRequest, req: Request, response: Response):
+    """
+    Start a query in the background and return its job id at once.
+    The query runs as a turn of the session, like /api/mcp/query; poll
+    GET /api/mcp/jobs/{job_id} for progress and the result.
+    """
+    if not request.query:
+        return JSONResponse(
+            status_code=400,
+            content=StandardResponse(
+                status_code=400,
+                status=False,
+                message="Query is required",
+                path=str(req.url.path),
+                data=None
+            ).model_dump()
+        )
+    session = await load_session(request.sessionId)
+    if not session:
+        return JSONResponse(
+            status_code=404,
+            content=StandardResponse(
+                status_code=404,
+                status=False,
+                message="Session not found. Please activate configuration first.",
+                path=str(req.url.path),
+                data=None
+            ).model_dump()
+        )
+    try:
+        budget = query_budget(request)
+        job = jobs.submit(request.sessionId, request.query, lambda job: run_job(job, session, budget))
+    except JobLimitReached as e:
+        metrics.record_error(req.url.path, e)
+        return JSONResponse(
+            status_code=429,
+            content=StandardResponse(
+                status_code=429,
+                status=False,
+                message=str(e),
+                path=str(req.url.path),
+                data=None
+            ).model_dump(),
+            headers={"Retry-After": "5"}
+        )
+    response.headers["Location"] = f"/api/mcp/jobs/{job.job_id}"
+    response.headers["X-MCP-Session-Owner"] = WORKER_ID
+    return StandardResponse(
+        status_code=202,
+        status=True,
+        message="Job accepted",
+        path=str(req.url.path),
+        data=JobResponseData(**job.to_dict())
+    )
+
+
+@app.get(
+    "/api/mcp/jobs/{job_id}",
+    response_model=StandardResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {
+            "model": StandardResponse,
+            "description": "Not Found",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 404,
+                        "status": False,
+                        "message": "Job not found",
+                        "path": "/api/mcp/jobs/{job_id}",
+                        "data": None
+                    }
+                }
+            }
+        }
+    }
+)
+async def get_job(job_id: str, req: Request):
+    """Return a job's status, the steps and tool calls made so far and, once finished, its result."""
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse(
+            status_code=404,
+            content=StandardResponse(
+                status_code=404,
+                status=False,
+                message="Job not found",
+                path=str(req.url.path),
+                data=None
+            ).model_dump()
+        )
+    return StandardResponse(
+        status_code=200,
+        status=True,
+        message=f"Job {job.status}",
+        path=str(req.url.path),
+        data=JobResponseData(**job.to_dict())
+    )
+
+
+@app.delete(
+    "/api/mcp/jobs/{job_id}",
+    response_model=StandardResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {
+            "model": StandardResponse,
+            "description": "Not Found",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 404,
+                        "status": False,
+                        "message": "Job not found",
+                        "path": "/api/mcp/jobs/{job_id}",
+                        "data": None
+                    }
+                }
+            }
+        }
+    }
+)
+async def cancel_job(job_id: str, req: Request):
+    """Cancel a job, stopping the agent and any tool call in flight. Finished jobs are left as they are."""
+    job = await jobs.cancel(job_id)
+    if job is None:
+        return JSONResponse(
+            status_code=404,
+            content=StandardResponse(
+                status_code=404,
+                status=False,
+                message="Job not found",
+                path=str(req.url.path),
+                data=None
+            ).model_dump()
+        )
+    return StandardResponse(
+        status_code=200,
+        status=True,
+        message="Job cancelled" if job.status == "cancelled" else f"Job already {job.status}",
+        path=str(req.url.path),
+        data=JobResponseData(**job.to_dict())
+    )
+
+
+@app.get(
+    "/health",
+    response_model=StandardResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        500: {
+            "model": StandardResponse,
+            "description": "Internal Server Error",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 500,
+                        "status": False,
+                        "message": "Internal server error",
+                        "path": "/health",
+                        "data": None
+                    }
+                }
+            }
+        }
+    }
+)
+async def health_check(req: Request):
+    """Health check endpoint."""
+    response_data = HealthResponseData(service="MCP Backend Service")
+    return StandardResponse(
+        status_code=200,
+        status=True,
+        message="Service is healthy",
+        path=str(req.url.path),
+        data=response_data
+    )
+
+
+@app.delete(
+    "/api/mcp/session/{session_id}",
+    response_model=StandardResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {
+            "model": StandardResponse,
+            "description": "Not Found",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 404,
+                        "status": False,
+                        "message": "Session not found",
+                        "path": "/api/mcp/session/{session_id}",
+                        "data": None
+                    }
+                }
+            }
+        },
+        422: {
             "model": StandardResponse,
             "description": "Validation Error",
             "content": {
@@ -590,10 +1879,9 @@ async def health_check(req: Request):
 async def clear_session(session_id: str, req: Request):
     """Clear a session and its associated agent/client."""
     try:
-        if session_id in active_agents:
-            del active_agents[session_id]
-        if session_id in active_clients:
-            del active_clients[session_id]
+        await session_store.remove(session_id)
+        if session_registry:
+            await session_registry.delete(session_id)
         
         response_data = SessionClearResponseData(message=f"Session {session_id} cleared")
         return StandardResponse(
@@ -612,8 +1900,54 @@ async def clear_session(session_id: str, req: Request):
                 message=str(e),
                 path=str(req.url.path),
                 data=None
-            ).dict()
+            ).model_dump()
+        )
+
+
+@app.get(
+    "/api/mcp/session/{session_id}/offloaded/{ref}",
+    response_model=StandardResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {
+            "model": StandardResponse,
+            "description": "Not Found",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 404,
+                        "status": False,
+                        "message": "Offloaded content not found",
+                        "path": "/api/mcp/session/{session_id}/offloaded/{ref}",
+                        "data": None
+                    }
+                }
+            }
+        }
+    }
+)
+async def get_offloaded_content(session_id: str, ref: str, req: Request):
+    """Return the full text of a message that the session's memory policy offloaded."""
+    session = await session_store.get(session_id)
+    content = session.memory.offloaded.get(ref) if session and session.memory else None
+    if content is None:
+        return JSONResponse(
+            status_code=404,
+            content=StandardResponse(
+                status_code=404,
+                status=False,
+                message="Offloaded content not found",
+                path=str(req.url.path),
+                data=None
+            ).model_dump()
         )
+    return StandardResponse(
+        status_code=200,
+        status=True,
+        message="Offloaded content retrieved successfully",
+        path=str(req.url.path),
+        data=OffloadedContentResponseData(ref=ref, content=content)
+    )
 
 
 @app.get(
@@ -640,9 +1974,10 @@ async def clear_session(session_id: str, req: Request):
 )
 async def list_sessions(req: Request):
     """List all active sessions."""
+    await session_store.sweep()
     response_data = SessionListResponseData(
-        sessions=list(active_agents.keys()),
-        count=len(active_agents)
+        sessions=session_store.ids(),
+        count=len(session_store)
     )
     return StandardResponse(
         status_code=200,
@@ -653,6 +1988,77 @@ async def list_sessions(req: Request):
     )
 
 
+
+@app.get(
+    "/api/mcp/sessions/stats",
+    response_model=StandardResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        500: {
+            "model": StandardResponse,
+            "description": "Internal Server Error",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status_code": 500,
+                        "status": False,
+                        "message": "Internal server error",
+                        "path": "/api/mcp/sessions/stats",
+                        "data": None
+                    }
+                }
+            }
+        }
+    }
+)
+async def session_stats(req: Request):
+    """Report session store occupancy, eviction counters and MCP client pool usage."""
+    await session_store.sweep()
+    response_data = SessionStatsResponseData(
+        sessions=session_store.stats(),
+        pool=client_pool.stats(),
+        admission=admission.stats(),
+        response_cache=response_cache.stats() if response_cache else None,
+        tool_cache=tool_result_cache.stats(),
+        tool_catalog=tool_catalog.stats() if tool_catalog else None,
+        tool_selection=tool_selector.stats(),
+        activation_plans=activation_plans.stats(),
+        llm=llm_clients.stats(),
+        routing=routing_stats.stats(),
+        tool_concurrency=tool_limiter.stats(),
+        jobs=jobs.stats(),
+        tracing=tracer.stats() if tracer.enabled else None,
+        recorder=recorder.stats() if recorder.enabled else None,
+        registry=session_registry.stats() if session_registry else None
+    )
+    return StandardResponse(
+        status_code=200,
+        status=True,
+        message="Session stats retrieved successfully",
+        path=str(req.url.path),
+        data=response_data
+    )
+
+
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Metrics in the Prometheus text exposition format",
+            "content": {
+                "text/plain": {
+                    "example": "# HELP mcp_active_sessions Sessions held in the session store.\n# TYPE mcp_active_sessions gauge\nmcp_active_sessions 2\n"
+                }
+            }
+        }
+    }
+)
+async def get_metrics():
+    """Expose counters and histograms for scraping by Prometheus."""
+    return PlainTextResponse(metrics.registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,132 @@
+"""
+Micro-benchmark for serializing and compressing large query responses.
+Encodes a StandardResponse carrying a multi-megabyte scrape-like answer the previous way
+(.dict() and the json module), with orjson and with pydantic's own encoder; times the
+parse and re-encode the frontend proxy used to do; and reports size and speed of each
+compression the backend can negotiate.
+
+Usage (from the backend directory):
+    python benchmarks/bench_serialization.py --megabytes 4 --repeat 3
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from compression import BrotliCompressor, GzipCompressor, brotli  # noqa: E402
+
+LINES = [
+    "# Distributed systems reading list",
+    "Consensus protocols such as Raft and Paxos keep replicas in agreement.",
+    "| Protocol | Leader | Message rounds |",
+    "| --- | --- | --- |",
+    "| Raft | yes | 1 |",
+    "Links: [paper](https://example.com/raft.pdf) \"quoted\" \\ escaped",
+    "Résumé, naïve café, 東京, emoji 🚀 and other non-ASCII text.",
+    "    code block: for (i = 0; i < n; i++) { total += values[i]; }",
+]
+
+
+class StandardResponse(BaseModel):
+    """Same shape as backend_service.StandardResponse."""
+    status_code: int
+    status: bool
+    message: str
+    path: str
+    data: Optional[Any] = None
+
+
+def make_text(megabytes: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    parts, size = [], 0
+    while size < target:
+        line = f"{rng.choice(LINES)} [{rng.randrange(10 ** 6)}]\n"
+        parts.append(line)
+        size += len(line.encode("utf-8"))
+    return "".join(parts)
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def report(name: str, seconds: float, size_mb: float, extra: str = "") -> None:
+    print(f"{name:36s} {seconds * 1000:9.1f} ms  {size_mb / seconds:8.1f} MB/s  {extra}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark response serialization and compression")
+    parser.add_argument("--megabytes", type=float, default=4.0, help="Size of the generated answer")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant; the best is reported")
+    parser.add_argument("--chunk-size", type=int, default=65536, help="Bytes per chunk for streamed compression")
+    args = parser.parse_args()
+
+    response = StandardResponse(
+        status_code=200,
+        status=True,
+        message="Query executed successfully",
+        path="/api/mcp/query",
+        data={"result": make_text(args.megabytes), "stopReason": None},
+    )
+
+    def previous() -> bytes:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            return JSONResponse(content=response.dict()).body
+
+    body = ORJSONResponse(content=response.model_dump()).body
+    if json.loads(previous()) != json.loads(body) or json.loads(response.model_dump_json()) != json.loads(body):
+        raise SystemExit("encoders disagree")
+    size_mb = len(body) / (1024 * 1024)
+    print(f"Response body: {len(body):,} bytes")
+
+    print("\nEncoding")
+    for name, fn in (
+        (".dict() + json module (previous)", previous),
+        ("model_dump() + orjson", lambda: ORJSONResponse(content=response.model_dump()).body),
+        ("model_dump_json()", response.model_dump_json),
+    ):
+        report(name, best_of(args.repeat, fn), size_mb)
+
+    print("\nFrontend proxy")
+    report("parse + re-encode (previous)", best_of(args.repeat, lambda: json.dumps(json.loads(body))), size_mb)
+    print(f"{'passthrough':36s} {'0.0':>9s} ms")
+
+    print("\nCompression")
+    compressors = [(f"gzip level {level}", lambda level=level: GzipCompressor(level)) for level in (1, 6, 9)]
+    if brotli is not None:
+        compressors += [(f"brotli quality {quality}", lambda quality=quality: BrotliCompressor(quality)) for quality in (1, 4, 6)]
+    else:
+        print("(install the brotli package to include brotli)")
+    for name, factory in compressors:
+        compressed = factory().compress(body, final=True)
+
+        def streamed() -> bytes:
+            compressor = factory()
+            chunks = [body[i:i + args.chunk_size] for i in range(0, len(body), args.chunk_size)]
+            return b"".join(compressor.compress(chunk, final=(i == len(chunks) - 1)) for i, chunk in enumerate(chunks))
+
+        ratio = len(body) / len(compressed)
+        report(name, best_of(args.repeat, lambda: factory().compress(body, final=True)), size_mb,
+               f"{len(compressed):>11,} bytes  x{ratio:.1f}")
+        report(f"  streamed ({args.chunk_size}-byte chunks)", best_of(args.repeat, streamed), size_mb,
+               f"{len(streamed()):>11,} bytes")
+
+
+if __name__ == "__main__":
+    main()
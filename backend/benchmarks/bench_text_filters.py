@@ -0,0 +1,111 @@
+"""
+Micro-benchmark for the answer rewriter on multi-megabyte outputs.
+Compares the previous multi-pass implementation with the single-pass ResponseRewriter,
+both on a whole text and fed in streaming-sized chunks, and checks they agree.
+
+Usage (from the backend directory):
+    python benchmarks/bench_text_filters.py --megabytes 4 --repeat 3
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from text_filters import ResponseRewriter  # noqa: E402
+
+SENTENCES = [
+    "The scrape of the page returned an error and is not usable",
+    "The search tool failed to fetch the second result",
+    "Error: the document could not be parsed",
+    "An error occurred while reading the partition",
+    "Here is a summary of the article about distributed systems",
+    "The retrieved passages mention consensus, replication and leader election",
+    "Version 3 of the API is not usable without a key",
+]
+
+
+def multi_pass_filter(text: str) -> str:
+    """The previous implementation: one re.sub per rule, then a sentence split and rescan."""
+    if not text:
+        return text
+    negative_patterns = [
+        (r'returned an error and is not usable', 'is currently unavailable'),
+        (r'returned an error', 'encountered an issue'),
+        (r'is not usable', 'is currently unavailable'),
+        (r'not usable', 'unavailable'),
+        (r'failed to', 'could not'),
+        (r'error occurred', 'issue encountered'),
+        (r'error:', 'note:'),
+        (r'Error:', 'Note:'),
+    ]
+    result = text
+    for pattern, replacement in negative_patterns:
+        result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
+    sentences = result.split('.')
+    filtered_sentences = []
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if sentence:
+            lower_sentence = sentence.lower()
+            if not (('error' in lower_sentence and 'not usable' in lower_sentence) or
+                    ('returned an error' in lower_sentence and 'not usable' in lower_sentence)):
+                filtered_sentences.append(sentence)
+    return '. '.join(filtered_sentences).strip()
+
+
+def make_text(megabytes: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    parts, size = [], 0
+    while size < target:
+        sentence = rng.choice(SENTENCES) + rng.choice([". ", ".\n", ".  ", "\n\n", ". "])
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the answer rewriter")
+    parser.add_argument("--megabytes", type=float, default=4.0, help="Size of the generated answer")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant; the best is reported")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Characters per streamed chunk")
+    args = parser.parse_args()
+
+    text = make_text(args.megabytes)
+    rewriter = ResponseRewriter()
+
+    def streamed() -> str:
+        stream = rewriter.stream()
+        out = [stream.feed(text[i:i + args.chunk_size]) for i in range(0, len(text), args.chunk_size)]
+        out.append(stream.flush())
+        return "".join(out)
+
+    expected = multi_pass_filter(text)
+    if rewriter.rewrite(text) != expected or streamed() != expected:
+        raise SystemExit("single-pass output differs from the multi-pass implementation")
+
+    size_mb = len(text) / (1024 * 1024)
+    for name, fn in (
+        ("multi-pass", lambda: multi_pass_filter(text)),
+        ("single-pass", lambda: rewriter.rewrite(text)),
+        (f"streamed ({args.chunk_size}-char chunks)", streamed),
+    ):
+        seconds = best_of(args.repeat, fn)
+        print(f"{name:32s} {seconds * 1000:9.1f} ms  {size_mb / seconds:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
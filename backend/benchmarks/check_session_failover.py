@@ -0,0 +1,120 @@
+"""
+Two-worker check for the shared session registry.
+Starts the fake LLM and two backend workers sharing one SQLite registry written
+through on every turn, then alternates a session's turns between them. Each worker
+must pick up the turns the other one served, so the stored history ends up holding
+every turn in order. Exits non-zero if a turn was lost or reordered.
+
+Usage (from the backend directory):
+    python benchmarks/check_session_failover.py --turns A B A B
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from run_benchmark import BACKEND_DIR, BENCHMARK_DIR, free_port, wait_until_healthy  # noqa: E402
+
+SESSION_ID = "failover-check"
+
+
+def start_worker(port: int, llm_url: str, registry_path: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "FRONTEND_URL": "http://localhost:3000",
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENROUTER_BASE_URL": llm_url,
+        "MCP_MAX_STEPS": "5",
+        "MCP_USE_ANONYMIZED_TELEMETRY": "false",
+        "MCP_SESSION_REGISTRY": "sqlite",
+        "MCP_SESSION_REGISTRY_PATH": registry_path,
+        "MCP_SESSION_SNAPSHOT_INTERVAL": "0",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend_service:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def stored_turns(registry_path: str) -> List[str]:
+    """User turns of the check session as stored in the registry."""
+    with sqlite3.connect(registry_path) as db:
+        row = db.execute("SELECT record FROM sessions WHERE session_id = ?", (SESSION_ID,)).fetchone()
+    if row is None:
+        return []
+    return [item["content"] for item in json.loads(row[0])["history"] if item["role"] == "user"]
+
+
+async def run_turns(workers: Dict[str, str], turns: List[str], timeout: float) -> Dict[str, dict]:
+    config = {"mcpServers": {"check": {"command": sys.executable, "args": [str(BENCHMARK_DIR / "fake_mcp_server.py")]}}}
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        for url in workers.values():
+            await wait_until_healthy(client, f"{url}/health", 60)
+        first = workers[turns[0]]
+        response = await client.post(f"{first}/api/mcp/activate", json={"config": config, "sessionId": SESSION_ID})
+        response.raise_for_status()
+        for n, name in enumerate(turns, 1):
+            response = await client.post(
+                f"{workers[name]}/api/mcp/query", json={"query": f"turn{n}", "sessionId": SESSION_ID}
+            )
+            response.raise_for_status()
+            print(f"turn{n} served by worker {name} ({response.headers.get('x-mcp-session-owner')})")
+        registries = {}
+        for name, url in workers.items():
+            response = await client.get(f"{url}/api/mcp/sessions/stats")
+            registries[name] = response.json()["data"]["registry"]
+        return registries
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Alternate a session between two workers sharing a registry")
+    parser.add_argument("--turns", nargs="+", choices=["A", "B"], default=["A", "B", "A", "B"],
+                        help="Worker serving each turn, in order")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry_path = os.path.join(tmp, "sessions.db")
+        llm_port = free_port()
+        llm_url = f"http://127.0.0.1:{llm_port}"
+        ports = {"A": free_port(), "B": free_port()}
+        procs = [subprocess.Popen([sys.executable, str(BENCHMARK_DIR / "fake_llm.py"), "--port", str(llm_port)])]
+        procs += [start_worker(port, llm_url, registry_path) for port in ports.values()]
+        try:
+            registries = asyncio.run(run_turns(
+                {name: f"http://127.0.0.1:{port}" for name, port in ports.items()}, args.turns, args.timeout
+            ))
+        finally:
+            for proc in reversed(procs):
+                proc.terminate()
+            for proc in procs:
+                try:
+                    proc.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        turns = stored_turns(registry_path)
+
+    expected = [f"turn{n}" for n in range(1, len(args.turns) + 1)]
+    for name, stats in registries.items():
+        print(f"worker {name}: rebuilds={stats['rebuilds']} conflicts={stats['conflicts']}")
+    print(f"stored turns: {turns}")
+    if turns != expected:
+        print(f"FAILED: expected {expected}")
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Deterministic OpenAI-compatible chat completions stub for benchmarks.
+When the request offers tools and the last message is not a tool result, it answers
+with a call to the first tool; otherwise it returns a fixed final answer. Point the
+backend at it with OPENROUTER_BASE_URL=http://127.0.0.1:<port>.
+
+Usage:
+    python fake_llm.py --port 8765 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FINAL_ANSWER = "The tool returned the requested data. This is the benchmark answer."
+USAGE = {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+
+app = FastAPI(title="Fake LLM")
+
+
+def next_message(body: dict) -> tuple:
+    """Return the assistant message and finish reason for a request."""
+    messages = body.get("messages", [])
+    tools = body.get("tools") or []
+    if tools and messages and messages[-1].get("role") != "tool":
+        tool = tools[0]["function"]
+        properties = tool.get("parameters", {}).get("properties", {})
+        arguments = {name: "benchmark" for name in properties}
+        tool_call = {
+            "id": f"call_{len(messages)}",
+            "type": "function",
+            "function": {"name": tool["name"], "arguments": json.dumps(arguments)},
+        }
+        return {"role": "assistant", "content": None, "tool_calls": [tool_call]}, "tool_calls"
+    return {"role": "assistant", "content": FINAL_ANSWER}, "stop"
+
+
+def stream_chunks(body: dict, message: dict, finish_reason: str):
+    base = {"id": "bench", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", "")}
+    if message.get("tool_calls"):
+        delta = {"role": "assistant", "tool_calls": [dict(index=0, **message["tool_calls"][0])]}
+        yield "data: " + json.dumps({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}) + "\n\n"
+    else:
+        for word in message["content"].split(" "):
+            delta = {"role": "assistant", "content": word + " "}
+            yield "data: " + json.dumps({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}) + "\n\n"
+    yield "data: " + json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}) + "\n\n"
+    yield "data: " + json.dumps({**base, "choices": [], "usage": USAGE}) + "\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/chat/completions")
+async def chat_completions(req: Request):
+    body = await req.json()
+    await asyncio.sleep(float(os.getenv("FAKE_LLM_LATENCY", "0")))
+    message, finish_reason = next_message(body)
+    if body.get("stream"):
+        return StreamingResponse(stream_chunks(body, message, finish_reason), media_type="text/event-stream")
+    return JSONResponse({
+        "id": "bench",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", ""),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": USAGE,
+    })
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Deterministic OpenAI-compatible stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before every completion")
+    args = parser.parse_args()
+    os.environ["FAKE_LLM_LATENCY"] = str(args.latency)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,22 @@
+"""
+Stub stdio MCP server for benchmarks.
+Exposes a single `lookup` tool that sleeps for FAKE_MCP_LATENCY seconds (default 0.05)
+and echoes its argument, so tool latency can be tuned per run without network access.
+"""
+import asyncio
+import os
+
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("benchmark", log_level="WARNING")
+
+
+@mcp.tool()
+async def lookup(query: str) -> str:
+    """Look up a query and return a fixed result."""
+    await asyncio.sleep(float(os.getenv("FAKE_MCP_LATENCY", "0.05")))
+    return f"result for {query}"
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,240 @@
+"""
+Replay recorded agent runs offline.
+Feeds recordings written with MCP_RECORD_DIR back through MCPAgent and the backend's
+agent runner. The LLM is replaced by the recorded responses and the MCP servers by the
+recorded tool results, so no network or API keys are needed. With the default
+--latency-scale 0 the upstreams answer instantly and the replay time is the framework's
+own overhead; --latency-scale 1 reproduces the recorded LLM and tool latencies.
+A replay that makes different tool calls or reaches a different answer than the
+recording is reported as diverged, and the script exits non-zero, so a directory of
+recordings doubles as a regression suite.
+
+Usage (from the backend directory):
+    python benchmarks/replay_recording.py recordings/ --repeat 5
+    python benchmarks/replay_recording.py recordings/20250101T120000-abc-1234abcd.jsonl --latency-scale 1
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+os.environ.setdefault("MCP_USE_ANONYMIZED_TELEMETRY", "false")
+
+from langchain_core.language_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, BaseMessage, messages_from_dict  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+from mcp.types import CallToolResult, Tool  # noqa: E402
+from mcp_use import MCPAgent  # noqa: E402
+from mcp_use.connectors.base import BaseConnector  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agent_runner import RunBudget, run_agent  # noqa: E402
+
+
+class ReplayDivergence(RuntimeError):
+    """The replayed run asked for something the recording does not contain."""
+
+
+class Recording:
+    """A parsed recording file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        events = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+        self.header = events[0]
+        if self.header.get("type") != "run":
+            raise ValueError(f"{path} is not a run recording")
+        self.llm_events = [e for e in events if e["type"] in ("llm_response", "llm_error")]
+        self.tool_calls = [e for e in events if e["type"] == "tool_call"]
+        self.tools = next((e["tools"] for e in events if e["type"] == "llm_request" and e.get("tools")), None) or []
+        self.final = next((e for e in events if e["type"] == "final"), None)
+
+    @property
+    def duration_ms(self) -> float:
+        return self.final["duration_ms"] if self.final else 0.0
+
+    @property
+    def llm_ms(self) -> float:
+        return sum(e.get("duration_ms") or 0 for e in self.llm_events)
+
+    @property
+    def tool_ms(self) -> float:
+        # Summed, so parallel calls count more than once
+        return sum(e.get("duration_ms") or 0 for e in self.tool_calls)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Answers each LLM call with the next recorded response."""
+
+    events: List[Dict[str, Any]]
+    latency_scale: float = 0.0
+    position: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ReplayChatModel":
+        return self
+
+    def _next(self) -> Tuple[Dict[str, Any], Optional[AIMessage]]:
+        if self.position >= len(self.events):
+            raise ReplayDivergence(f"LLM call {self.position + 1} was not recorded")
+        event = self.events[self.position]
+        self.position += 1
+        if event["type"] == "llm_error":
+            return event, None
+        recorded = messages_from_dict([event["message"]])[0]
+        message = AIMessage(
+            content=recorded.content,
+            tool_calls=getattr(recorded, "tool_calls", []),
+            usage_metadata=getattr(recorded, "usage_metadata", None),
+        )
+        return event, message
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        event, message = self._next()
+        if self.latency_scale and event.get("duration_ms"):
+            await asyncio.sleep(event["duration_ms"] / 1000 * self.latency_scale)
+        if message is None:
+            raise RuntimeError(event["error"])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        event, message = self._next()
+        if message is None:
+            raise RuntimeError(event["error"])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class ReplayConnector(BaseConnector):
+    """An MCP connector serving the recorded tools and tool results."""
+
+    def __init__(self, recording: Recording, latency_scale: float = 0.0):
+        super().__init__()
+        self.recording = recording
+        self.latency_scale = latency_scale
+        self.pending = list(recording.tool_calls)
+        self.calls: List[Tuple[str, str]] = []
+
+    @property
+    def public_identifier(self) -> str:
+        return f"replay:{self.recording.path.name}"
+
+    async def connect(self) -> None:
+        # The adapter expects a connected server to list its tools right away
+        self._connected = True
+        await self.initialize()
+
+    async def disconnect(self) -> None:
+        self._connected = False
+
+    async def initialize(self) -> Dict[str, Any]:
+        self._tools = [
+            Tool(
+                name=tool["function"]["name"],
+                description=tool["function"].get("description") or "",
+                inputSchema=tool["function"].get("parameters") or {"type": "object", "properties": {}},
+            )
+            for tool in self.recording.tools
+        ]
+        self._resources = []
+        self._prompts = []
+        self._initialized = True
+        return {}
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any], read_timeout_seconds: Any = None) -> CallToolResult:
+        self.calls.append((name, json.dumps(arguments, sort_keys=True)))
+        # Same tool and arguments first; parallel calls were recorded in completion order
+        match = next((e for e in self.pending if e["tool"] == name and e["arguments"] == arguments), None)
+        match = match or next((e for e in self.pending if e["tool"] == name), None)
+        if match is None:
+            raise ReplayDivergence(f"Tool call {name}({arguments}) was not recorded")
+        self.pending.remove(match)
+        if self.latency_scale and match.get("duration_ms"):
+            await asyncio.sleep(match["duration_ms"] / 1000 * self.latency_scale)
+        if "error" in match:
+            raise RuntimeError(match["error"])
+        return CallToolResult.model_validate(match["result"])
+
+
+async def replay(recording: Recording, latency_scale: float, max_steps: int) -> Dict[str, Any]:
+    """Replay one recording once; returns timings and the first divergence, if any."""
+    started = time.perf_counter()
+    model = ReplayChatModel(events=recording.llm_events, latency_scale=latency_scale)
+    connector = ReplayConnector(recording, latency_scale)
+    agent = MCPAgent(llm=model, connectors=[connector], max_steps=max_steps)
+    await agent.initialize()
+    setup = time.perf_counter() - started
+    started = time.perf_counter()
+    divergence = None
+    result = stop_reason = None
+    try:
+        result, stop_reason = await run_agent(agent, recording.header["query"], RunBudget(**(recording.header.get("budget") or {})))
+    except Exception as e:
+        divergence = f"{type(e).__name__}: {e}"
+    run = time.perf_counter() - started
+    await agent.close()
+
+    expected_calls = sorted((e["tool"], json.dumps(e["arguments"], sort_keys=True)) for e in recording.tool_calls)
+    if divergence is None and model.position != len(recording.llm_events):
+        divergence = f"{model.position} LLM calls, recorded {len(recording.llm_events)}"
+    if divergence is None and sorted(connector.calls) != expected_calls:
+        divergence = f"tool calls differ: {connector.calls}"
+    if divergence is None and recording.final and result != recording.final["result"]:
+        divergence = "answer differs from the recording"
+    return {"setup": setup, "run": run, "stop_reason": stop_reason, "divergence": divergence}
+
+
+def recording_paths(paths: List[str]) -> List[Path]:
+    found = []
+    for path in map(Path, paths):
+        found.extend(sorted(path.glob("*.jsonl")) if path.is_dir() else [path])
+    return found
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    paths = recording_paths(args.paths)
+    if not paths:
+        print("No recordings found")
+        return 1
+    diverged = 0
+    print(f"{'recording':44s} {'recorded':>9s} {'llm':>9s} {'tools':>9s} {'setup':>9s} {'replay':>9s}  result")
+    for path in paths:
+        recording = Recording(path)
+        runs = [await replay(recording, args.latency_scale, args.max_steps) for _ in range(args.repeat)]
+        divergence = next((run["divergence"] for run in runs if run["divergence"]), None)
+        diverged += divergence is not None
+        print(
+            f"{path.name[-44:]:44s} {recording.duration_ms:7.1f}ms {recording.llm_ms:7.1f}ms {recording.tool_ms:7.1f}ms"
+            f" {statistics.median(run['setup'] for run in runs) * 1000:7.1f}ms"
+            f" {statistics.median(run['run'] for run in runs) * 1000:7.1f}ms"
+            f"  {'diverged: ' + divergence if divergence else 'ok'}"
+        )
+    print(f"\n{len(paths)} recordings, {diverged} diverged (times are medians of {args.repeat} replays;"
+          f" recorded llm and tool times are sums)")
+    return 1 if diverged else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded agent runs with stubbed LLM and MCP servers")
+    parser.add_argument("paths", nargs="+", help="Recording files or directories of recordings")
+    parser.add_argument("--repeat", type=int, default=3, help="Replays per recording; medians are reported")
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="Multiplier for recorded LLM and tool latencies (0 answers instantly)")
+    parser.add_argument("--max-steps", type=int, default=int(os.getenv("MCP_MAX_STEPS", "100")),
+                        help="Agent step limit, as MCP_MAX_STEPS")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Load test for the MCP backend.
+Starts the fake LLM and the backend (unless --backend-url is given), activates sessions
+against the stub MCP server, runs queries at the requested concurrency and reports
+activation latency, query latency percentiles, throughput, RSS growth per session and
+the number of backend subprocesses. Everything runs locally; no network access needed.
+
+Usage (from the backend directory):
+    python benchmarks/run_benchmark.py --sessions 20 --queries 5 --concurrency 10
+    python benchmarks/run_benchmark.py --distinct-configs --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCHMARK_DIR.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile, in milliseconds rounded to 0.1."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return round(ordered[index] * 1000, 1)
+
+
+def latency_summary(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.fmean(values) * 1000, 1) if values else None,
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": round(max(values) * 1000, 1) if values else None,
+    }
+
+
+def child_pids(pid: int) -> List[int]:
+    """All descendant pids of a process, read from /proc (Linux only)."""
+    parents: Dict[int, List[int]] = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The command name may contain spaces, so split after its closing parenthesis
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        parents.setdefault(ppid, []).append(int(entry.name))
+    descendants, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            descendants.append(child)
+            stack.append(child)
+    return descendants
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process, or None if it cannot be read."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def process_snapshot(pid: Optional[int]) -> dict:
+    if pid is None or not Path("/proc").exists():
+        return {"rss_bytes": None, "subprocesses": None}
+    return {"rss_bytes": rss_bytes(pid), "subprocesses": len(child_pids(pid))}
+
+
+def mcp_config(args: argparse.Namespace, session_index: int) -> dict:
+    env = {"FAKE_MCP_LATENCY": str(args.tool_latency)}
+    if args.distinct_configs:
+        # A distinct env makes every session's config unique, so nothing is pooled
+        env["BENCHMARK_SESSION"] = str(session_index)
+    return {
+        "mcpServers": {
+            "benchmark": {
+                "command": sys.executable,
+                "args": [str(BENCHMARK_DIR / "fake_mcp_server.py")],
+                "env": env,
+            }
+        }
+    }
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(url)).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become healthy within {timeout}s")
+
+
+class Processes:
+    """Fake LLM and backend subprocesses started for a run."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.llm_url = f"http://127.0.0.1:{free_port()}"
+        self.backend_port = free_port()
+        self.backend_url = f"http://127.0.0.1:{self.backend_port}"
+        self.procs: List[subprocess.Popen] = []
+        self.backend: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        llm_port = self.llm_url.rsplit(":", 1)[1]
+        self.procs.append(subprocess.Popen(
+            [sys.executable, str(BENCHMARK_DIR / "fake_llm.py"), "--port", llm_port,
+             "--latency", str(self.args.llm_latency)],
+        ))
+        env = {
+            **os.environ,
+            "FRONTEND_URL": "http://localhost:3000",
+            "OPENROUTER_API_KEY": "benchmark",
+            "OPENROUTER_BASE_URL": self.llm_url,
+            "MCP_MAX_STEPS": "5",
+            "MCP_USE_ANONYMIZED_TELEMETRY": "false",
+        }
+        self.backend = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend_service:app", "--host", "127.0.0.1",
+             "--port", str(self.backend_port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        self.procs.append(self.backend)
+
+    def stop(self) -> None:
+        for proc in reversed(self.procs):
+            proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    processes = None
+    backend_url, backend_pid = args.backend_url, args.backend_pid
+    if not backend_url:
+        processes = Processes(args)
+        processes.start()
+        backend_url, backend_pid = processes.backend_url, processes.backend.pid
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=backend_url, timeout=args.timeout, limits=limits) as client:
+        try:
+            if processes:
+                await wait_until_healthy(client, f"{processes.llm_url}/docs", 30)
+            await wait_until_healthy(client, "/health", 60)
+            return await run_phases(args, client, backend_pid)
+        finally:
+            if processes:
+                processes.stop()
+
+
+async def run_phases(args: argparse.Namespace, client: httpx.AsyncClient, backend_pid: Optional[int]) -> dict:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    session_ids = [f"bench-{i}" for i in range(args.sessions)]
+    errors: Dict[str, int] = {}
+
+    def record_error(phase: str, response: Optional[httpx.Response]) -> None:
+        key = f"{phase}:{response.status_code if response is not None else 'transport'}"
+        errors[key] = errors.get(key, 0) + 1
+
+    async def timed(phase: str, method: str, url: str, payload: Optional[dict], latencies: List[float]) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=payload)
+            except httpx.TransportError:
+                record_error(phase, None)
+                return
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                record_error(phase, response)
+
+    baseline = process_snapshot(backend_pid)
+
+    activation_latencies: List[float] = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        timed("activate", "POST", "/api/mcp/activate",
+              {"config": mcp_config(args, i), "sessionId": session_id}, activation_latencies)
+        for i, session_id in enumerate(session_ids)
+    ))
+    activation_seconds = time.perf_counter() - started
+    activated = process_snapshot(backend_pid)
+
+    query_latencies: List[float] = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        timed("query", "POST", "/api/mcp/query",
+              {"query": f"benchmark question {n} for {session_id}", "sessionId": session_id}, query_latencies)
+        for n in range(args.queries)
+        for session_id in session_ids
+    ))
+    query_seconds = time.perf_counter() - started
+    queried = process_snapshot(backend_pid)
+
+    await asyncio.gather(*(
+        timed("delete", "DELETE", f"/api/mcp/session/{session_id}", None, [])
+        for session_id in session_ids
+    ))
+    # Give released MCP servers a moment to exit before counting leftovers
+    await asyncio.sleep(args.settle)
+    deleted = process_snapshot(backend_pid)
+
+    rss_growth = None
+    if baseline["rss_bytes"] is not None and queried["rss_bytes"] is not None and args.sessions:
+        rss_growth = round((queried["rss_bytes"] - baseline["rss_bytes"]) / args.sessions)
+
+    return {
+        "config": {
+            "sessions": args.sessions,
+            "queries_per_session": args.queries,
+            "concurrency": args.concurrency,
+            "llm_latency": args.llm_latency,
+            "tool_latency": args.tool_latency,
+            "distinct_configs": args.distinct_configs,
+        },
+        "activation": {**latency_summary(activation_latencies), "wall_seconds": round(activation_seconds, 3)},
+        "query": {
+            **latency_summary(query_latencies),
+            "wall_seconds": round(query_seconds, 3),
+            "throughput_qps": round(len(query_latencies) / query_seconds, 2) if query_seconds else None,
+        },
+        "process": {
+            "baseline": baseline,
+            "after_activation": activated,
+            "after_queries": queried,
+            "after_delete": deleted,
+            "rss_growth_per_session_bytes": rss_growth,
+        },
+        "errors": errors,
+    }
+
+
+def print_summary(report: dict) -> None:
+    activation, query, process = report["activation"], report["query"], report["process"]
+    print(f"activation: n={activation['count']} p50={activation['p50_ms']}ms p95={activation['p95_ms']}ms "
+          f"p99={activation['p99_ms']}ms")
+    print(f"query:      n={query['count']} p50={query['p50_ms']}ms p95={query['p95_ms']}ms "
+          f"p99={query['p99_ms']}ms throughput={query['throughput_qps']}/s")
+    print(f"rss growth: {process['rss_growth_per_session_bytes']} bytes/session")
+    print("subprocesses: " + " -> ".join(
+        str(process[stage]["subprocesses"])
+        for stage in ("baseline", "after_activation", "after_queries", "after_delete")
+    ))
+    if report["errors"]:
+        print(f"errors:     {report['errors']}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the MCP backend against local stubs")
+    parser.add_argument("--sessions", type=int, default=10, help="Sessions to activate")
+    parser.add_argument("--queries", type=int, default=3, help="Queries per session")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake LLM completion")
+    parser.add_argument("--tool-latency", type=float, default=0.05, help="Seconds per fake MCP tool call")
+    parser.add_argument("--distinct-configs", action="store_true",
+                        help="Give every session its own MCP config so no clients are pooled")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to wait after deleting sessions")
+    parser.add_argument("--backend-url", help="Benchmark an already running backend instead of starting one")
+    parser.add_argument("--backend-pid", type=int, help="PID of --backend-url's process, for RSS and subprocess counts")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    print_summary(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Shared, refcounted pool of MCP clients.
+Sessions that activate an identical (env-substituted) mcpServers config reuse the
+same MCPClient, and therefore the same warm MCP server processes. The servers of a
+client are started concurrently, each with its own timeout; a server that fails to
+start is left out while the others serve the session.
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from mcp_use import MCPClient
+from mcp_use.config import create_connector_from_config
+from mcp_use.session import MCPSession
+
+try:
+    from .tool_calls import InterceptorFactory, install_interceptors, propagate_cancellation
+    from .tool_catalog import ToolCatalog
+    from .tracing import Span, child_span, current_span
+except ImportError:
+    from tool_calls import InterceptorFactory, install_interceptors, propagate_cancellation
+    from tool_catalog import ToolCatalog
+    from tracing import Span, child_span, current_span
+
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """Return a canonical hash of the mcpServers section of a config."""
+    canonical = json.dumps(
+        config.get("mcpServers", {}),
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ServerStatus:
+    """Startup outcome of one MCP server of a pooled client."""
+    name: str
+    ready: bool = False
+    startup_seconds: Optional[float] = None
+    tools: int = 0
+    # Whether the tool list came from the on-disk catalog instead of discovery
+    cached: bool = False
+    error: Optional[str] = None
+
+
+class MCPStartupError(RuntimeError):
+    """Raised when none of a client's MCP servers could be started."""
+
+    def __init__(self, statuses: Dict[str, ServerStatus]):
+        details = "; ".join(f"{name}: {status.error}" for name, status in statuses.items())
+        super().__init__(f"No MCP server could be started ({details})" if details else "No MCP servers configured")
+        self.statuses = statuses
+
+
+@dataclass
+class PooledClient:
+    """A pooled MCP client and its bookkeeping."""
+    fingerprint: str
+    client: MCPClient
+    refcount: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+    idle_since: Optional[float] = None
+    start_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    ready: Optional[asyncio.Future] = None
+    stop: asyncio.Event = field(default_factory=asyncio.Event)
+    runner: Optional[asyncio.Task] = None
+    interceptor_factory: Optional[InterceptorFactory] = None
+    # Default per-server startup timeout; a server's "startupTimeout" key overrides it
+    start_timeout: float = 60.0
+    catalog: Optional[ToolCatalog] = None
+    # Tell servers about cancelled tool calls; a server's "notifyCancelled" key overrides it
+    notify_cancelled: bool = False
+    servers: Dict[str, ServerStatus] = field(default_factory=dict)
+
+    async def _run_sessions(self, trace_parent: Optional[Span] = None) -> None:
+        """
+        Own the MCP server sessions for the lifetime of the pooled client.
+        Starts one owner task per server, resolves `ready` once every server has
+        either started or failed, and waits for the servers to shut down.
+        Server startups are traced under trace_parent, the span of the request that started them.
+        """
+        servers = self.client.config.get("mcpServers", {})
+        loop = asyncio.get_running_loop()
+        started = {name: loop.create_future() for name in servers}
+        self.servers = {}
+        tasks = [
+            asyncio.create_task(self._run_server(name, server_config, started[name], trace_parent))
+            for name, server_config in servers.items()
+        ]
+        try:
+            await asyncio.gather(*(asyncio.shield(future) for future in started.values()))
+            if any(status.ready for status in self.servers.values()):
+                self.ready.set_result(self.servers)
+            else:
+                self.ready.set_exception(MCPStartupError(self.servers))
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if not self.ready.done():
+                self.ready.set_exception(MCPStartupError(self.servers))
+
+    async def _run_server(
+        self,
+        name: str,
+        server_config: Dict[str, Any],
+        started: asyncio.Future,
+        trace_parent: Optional[Span] = None,
+    ) -> None:
+        """
+        Start one server, keep it running until the stop signal and close it.
+        MCP sessions must be opened and closed from the same task, so each server
+        gets its own long-lived owner task.
+        """
+        status = self.servers[name] = ServerStatus(name=name)
+        timeout = float(server_config.get("startupTimeout") or self.start_timeout)
+        began = time.perf_counter()
+        connector = None
+        with child_span("mcp.server_start", attributes={"mcp.server": name}, parent=trace_parent) as span:
+            try:
+                connector = create_connector_from_config(
+                    server_config,
+                    sandbox=self.client.sandbox,
+                    sandbox_options=self.client.sandbox_options,
+                    sampling_callback=self.client.sampling_callback,
+                    elicitation_callback=self.client.elicitation_callback,
+                )
+                session = MCPSession(connector)
+                async with asyncio.timeout(timeout):
+                    if self.catalog is not None:
+                        status.cached = await self.catalog.initialize_session(session, server_config)
+                    else:
+                        await session.initialize()
+            except BaseException as e:
+                status.startup_seconds = time.perf_counter() - began
+                status.error = f"Timed out after {timeout:g}s" if isinstance(e, TimeoutError) else (str(e) or type(e).__name__)
+                if connector is not None:
+                    try:
+                        await connector.disconnect()
+                    except Exception:
+                        pass
+                span.record_error(status.error)
+                started.set_result(status)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                return
+
+            span.set_attribute("mcp.tools", len(connector.tools or []))
+            span.set_attribute("mcp.tools_cached", status.cached)
+
+        status.startup_seconds = time.perf_counter() - began
+        status.tools = len(connector.tools or [])
+        status.ready = True
+        if server_config.get("notifyCancelled", self.notify_cancelled):
+            propagate_cancellation(connector.client_session)
+        self.client.sessions[name] = session
+        self.client.active_sessions.append(name)
+        if self.interceptor_factory is not None:
+            install_interceptors(name, connector, self.interceptor_factory(name, server_config))
+        started.set_result(status)
+        try:
+            await self.stop.wait()
+        finally:
+            await self.client.close_session(name)
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the sessions owner task and wait for the servers to shut down.
+        If they do not stop within the timeout the owner task is cancelled, which
+        tears down the server subprocesses.
+        """
+        self.stop.set()
+        if self.runner is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self.runner), timeout)
+        except asyncio.TimeoutError:
+            self.runner.cancel()
+            await asyncio.gather(self.runner, return_exceptions=True)
+        except Exception:
+            pass
+
+
+class MCPClientPool:
+    """Refcounted MCP clients keyed by config fingerprint, with idle TTL eviction."""
+
+    def __init__(
+        self,
+        idle_ttl: float = 300.0,
+        close_timeout: float = 10.0,
+        interceptor_factory: Optional[InterceptorFactory] = None,
+        start_timeout: float = 60.0,
+        catalog: Optional[ToolCatalog] = None,
+        notify_cancelled: bool = False,
+    ):
+        self.idle_ttl = idle_ttl
+        self.close_timeout = close_timeout
+        self.interceptor_factory = interceptor_factory
+        self.start_timeout = start_timeout
+        self.catalog = catalog
+        self.notify_cancelled = notify_cancelled
+        self._entries: Dict[str, PooledClient] = {}
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def acquire(self, config: Dict[str, Any], fingerprint: Optional[str] = None) -> PooledClient:
+        """Return the pooled client for this config, creating it if needed."""
+        fingerprint = fingerprint or config_fingerprint(config)
+        async with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                entry = PooledClient(
+                    fingerprint=fingerprint,
+                    client=MCPClient.from_dict(config),
+                    interceptor_factory=self.interceptor_factory,
+                    start_timeout=self.start_timeout,
+                    catalog=self.catalog,
+                    notify_cancelled=self.notify_cancelled,
+                )
+                self._entries[fingerprint] = entry
+                self.misses += 1
+            else:
+                self.hits += 1
+            entry.refcount += 1
+            entry.idle_since = None
+        await self.evict_idle()
+        return entry
+
+    async def release(self, fingerprint: str, close_if_unused: bool = False) -> None:
+        """
+        Drop one reference. Unreferenced clients are closed once idle for longer than
+        the TTL, or immediately when close_if_unused is set.
+        """
+        async with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return
+            entry.refcount = max(entry.refcount - 1, 0)
+            if entry.refcount == 0:
+                entry.idle_since = time.monotonic()
+                if close_if_unused:
+                    del self._entries[fingerprint]
+                else:
+                    entry = None
+            else:
+                entry = None
+        if entry is not None:
+            self.evictions += 1
+            await entry.close(self.close_timeout)
+        await self.evict_idle()
+
+    def get(self, fingerprint: str) -> Optional[PooledClient]:
+        """Return the pooled entry for a fingerprint, if any."""
+        return self._entries.get(fingerprint)
+
+    async def ensure_sessions(self, fingerprint: str) -> Dict[str, ServerStatus]:
+        """
+        Start the MCP server sessions for a pooled client exactly once and return the
+        startup status of each server. Raises MCPStartupError if no server started;
+        the next call then tries again.
+        """
+        entry = self._entries.get(fingerprint)
+        if entry is None:
+            raise KeyError(f"No pooled MCP client for fingerprint {fingerprint}")
+        async with entry.start_lock:
+            failed = entry.ready is not None and entry.ready.done() and entry.ready.exception() is not None
+            if entry.runner is None or failed:
+                entry.ready = asyncio.get_running_loop().create_future()
+                entry.stop = asyncio.Event()
+                # Run in a fresh context so request-scoped context variables do not leak in
+                entry.runner = asyncio.create_task(entry._run_sessions(current_span()), context=contextvars.Context())
+        return await asyncio.shield(entry.ready)
+
+    async def evict_idle(self, now: Optional[float] = None) -> int:
+        """Close clients that have been unreferenced for longer than the TTL."""
+        now = time.monotonic() if now is None else now
+        async with self._lock:
+            expired = [
+                fingerprint
+                for fingerprint, entry in self._entries.items()
+                if entry.refcount == 0
+                and entry.idle_since is not None
+                and now - entry.idle_since >= self.idle_ttl
+            ]
+            evicted = [self._entries.pop(fingerprint) for fingerprint in expired]
+        if evicted:
+            self.evictions += len(evicted)
+            await asyncio.gather(
+                *(entry.close(self.close_timeout) for entry in evicted),
+                return_exceptions=True,
+            )
+        return len(evicted)
+
+    async def close_all(self, timeout: Optional[float] = None) -> None:
+        """Close every pooled client concurrently, regardless of refcount."""
+        async with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        timeout = self.close_timeout if timeout is None else timeout
+        await asyncio.gather(*(entry.close(timeout) for entry in entries), return_exceptions=True)
+
+    def live_servers(self) -> int:
+        """Number of MCP server sessions currently running across all pooled clients."""
+        return sum(
+            len(entry.client.sessions)
+            for entry in self._entries.values()
+            if entry.runner is not None and not entry.runner.done()
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Return occupancy and hit/miss counters."""
+        return {
+            "clients": len(self._entries),
+            "live_servers": self.live_servers(),
+            "idle_clients": sum(1 for entry in self._entries.values() if entry.refcount == 0),
+            "references": sum(entry.refcount for entry in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,146 @@
+"""
+Response compression negotiated from Accept-Encoding.
+Brotli is preferred when the brotli package is installed and the client accepts it,
+then gzip. Small responses are sent as they are. Streamed bodies (the NDJSON batch
+endpoint) are compressed chunk by chunk and flushed after every chunk, so lines still
+reach the client as they are produced. Server-Sent Events are never compressed.
+"""
+import zlib
+from typing import Any, Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)
+
+
+def supported_encodings() -> tuple:
+    """Encodings this process can produce, in order of preference."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str, supported: Iterable[str]) -> Optional[str]:
+    """Pick the supported encoding the client weights highest; ties go to the earlier one."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+    best, best_weight = None, 0.0
+    for encoding in supported:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + (self._compressor.finish() if final else self._compressor.flush())
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies with brotli or gzip."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = supported_encodings()
+
+    def _compressor(self, encoding: str):
+        if encoding == "br":
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        compressor = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether to compress
+                start = message
+                return
+            if start is not None:
+                initial, start = start, None
+                if message["type"] == "http.response.body":
+                    message, compressor = self._begin(initial, message, encoding)
+                await send(initial)
+                await send(message)
+                return
+            if compressor is not None and message["type"] == "http.response.body":
+                more_body = message.get("more_body", False)
+                message = {**message, "body": compressor.compress(message.get("body", b""), final=not more_body)}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    def _begin(self, initial: Message, message: Message, encoding: str) -> Tuple[Message, Optional[Any]]:
+        """
+        Decide on the first body chunk whether to compress, rewriting the held-back
+        headers in place. Returns the chunk to send and the compressor for the rest.
+        """
+        headers = MutableHeaders(raw=initial["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if (
+            "content-encoding" in headers
+            or headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES)
+        ):
+            return message, None
+        headers.add_vary_header("Accept-Encoding")
+        if not more_body and len(body) < self.minimum_size:
+            return message, None
+        compressor = self._compressor(encoding)
+        body = compressor.compress(body, final=not more_body)
+        headers["Content-Encoding"] = encoding
+        if more_body:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(len(body))
+        return {**message, "body": body}, compressor
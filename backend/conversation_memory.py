@@ -0,0 +1,199 @@
+"""
+Bounded conversation memory for sessions.
+After every turn a session's history is compacted according to its memory policy:
+oversized messages are offloaded (kept aside and replaced by a preview plus a
+reference), then the history is cut to a token budget either by dropping the oldest
+turns ("window") or by folding them into a rolling summary ("summarize").
+Token counts are estimated from text length, which is close enough for budgeting.
+"""
+import uuid
+from typing import Any, Dict, List, Literal, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from pydantic import BaseModel, Field, field_validator
+
+# Approximate characters per token for English text and JSON
+CHARS_PER_TOKEN = 4
+# Fixed per-message cost of role markers and separators, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+OFFLOAD_PREVIEW_CHARS = 500
+# Run name and tag of the summarization call; metrics and tracing keep it apart from agent steps
+SUMMARY_RUN_NAME = "memory.summarize"
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below so it can replace it as context for later turns. "
+    "Keep facts, names, URLs, numbers, decisions and open questions; drop pleasantries. "
+    "Write at most {words} words."
+)
+
+
+def is_memory_call(tags: Optional[Sequence[str]]) -> bool:
+    """True for an LLM call made to maintain memory rather than by the agent."""
+    return SUMMARY_RUN_NAME in (tags or ())
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def message_tokens(message: BaseMessage) -> int:
+    content = message.content
+    return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(content if isinstance(content, str) else str(content))
+
+
+class MemoryPolicy(BaseModel):
+    """How a session's conversation memory is bounded; sent as "memory" on activation."""
+    strategy: Literal["full", "window", "summarize"] = "full"
+    # Token budget for the history, excluding the system prompt; ignored by "full"
+    maxTokens: int = Field(default=4000, ge=200)
+    # Messages larger than this are offloaded and replaced by a preview (0 disables)
+    offloadTokens: int = Field(default=0, ge=0)
+
+    @field_validator("offloadTokens")
+    @classmethod
+    def check_offload_tokens(cls, value: int) -> int:
+        # Smaller thresholds would offload the previews themselves
+        if value and value < 256:
+            raise ValueError("offloadTokens must be 0 (disabled) or at least 256")
+        return value
+
+
+class SessionMemory:
+    """Applies a MemoryPolicy to one agent's history; holds the offloaded content of messages still in it."""
+
+    def __init__(self, policy: MemoryPolicy):
+        self.policy = policy
+        self.offloaded: Dict[str, str] = {}
+        self.offloaded_bytes = 0
+        self.dropped_messages = 0
+        self.summaries = 0
+        self.summary_failures = 0
+        self.history_tokens = 0
+
+    async def apply(self, agent: Any) -> None:
+        """Compact the agent's history in place; call with the session lock held."""
+        history: List[BaseMessage] = agent.get_conversation_history()
+        if self.policy.offloadTokens:
+            for index, message in enumerate(history):
+                replacement = self._offload(message)
+                if replacement is not None:
+                    history[index] = replacement
+        if self.policy.strategy != "full" and self._tokens(history) > self.policy.maxTokens:
+            if self.policy.strategy == "summarize":
+                await self._summarize(agent, history)
+            self._drop_oldest(history)
+        self.history_tokens = self._tokens(history)
+
+    def _tokens(self, history: List[BaseMessage]) -> int:
+        return sum(message_tokens(message) for message in history if not isinstance(message, SystemMessage))
+
+    def _offload(self, message: BaseMessage) -> Optional[BaseMessage]:
+        """Return a preview message referencing the stored content, or None to keep the message."""
+        if isinstance(message, SystemMessage) or not isinstance(message.content, str):
+            return None
+        if message.additional_kwargs.get("offloaded") or message_tokens(message) <= self.policy.offloadTokens:
+            return None
+        ref = uuid.uuid4().hex[:12]
+        content = message.content
+        self.offloaded[ref] = content
+        self.offloaded_bytes += len(content)
+        preview = (
+            f"{content[:OFFLOAD_PREVIEW_CHARS]}\n"
+            f"[... {len(content) - OFFLOAD_PREVIEW_CHARS} more characters offloaded as {ref}]"
+        )
+        return message.model_copy(update={"content": preview, "additional_kwargs": {
+            **message.additional_kwargs, "offloaded": ref,
+        }})
+
+    def _drop_oldest(self, history: List[BaseMessage]) -> None:
+        """Drop the oldest turns until the budget holds, always keeping the latest exchange."""
+        while self._tokens(history) > self.policy.maxTokens:
+            # The rolling summary is only replaced by the next summary, never dropped
+            conversation = [
+                i for i, message in enumerate(history)
+                if not isinstance(message, SystemMessage) and not _is_summary(message)
+            ]
+            if len(conversation) <= 2:
+                break
+            self._forget(history.pop(conversation[0]))
+            # Do not leave an answer whose question is gone
+            next_index = conversation[1] - 1
+            if isinstance(history[next_index], (AIMessage, ToolMessage)) and not _is_summary(history[next_index]):
+                self._forget(history.pop(next_index))
+
+    async def _summarize(self, agent: Any, history: List[BaseMessage]) -> None:
+        """Fold older messages into one summary message, keeping recent ones within half the budget."""
+        conversation = [i for i, message in enumerate(history) if not isinstance(message, SystemMessage)]
+        keep_from = len(conversation)
+        recent_tokens = 0
+        while keep_from > 0:
+            cost = message_tokens(history[conversation[keep_from - 1]])
+            if len(conversation) - keep_from >= 2 and recent_tokens + cost > self.policy.maxTokens // 2:
+                break
+            recent_tokens += cost
+            keep_from -= 1
+        # Keep each recent answer together with its question
+        while 0 < keep_from < len(conversation) and isinstance(history[conversation[keep_from]], AIMessage):
+            keep_from -= 1
+        older = [conversation[i] for i in range(keep_from)]
+        if not older:
+            return
+        transcript = "\n\n".join(_transcript_line(history[i]) for i in older)
+        words = max(50, self.policy.maxTokens // 4)
+        try:
+            response = await agent.llm.ainvoke(
+                [
+                    SystemMessage(content=SUMMARY_INSTRUCTIONS.format(words=words)),
+                    HumanMessage(content=transcript),
+                ],
+                config={"run_name": SUMMARY_RUN_NAME, "tags": [SUMMARY_RUN_NAME]},
+            )
+        except Exception:
+            # Fall back to dropping the oldest turns
+            self.summary_failures += 1
+            return
+        summary = AIMessage(content=SUMMARY_PREFIX + str(response.content).strip())
+        for i in reversed(older):
+            self._forget(history.pop(i))
+        history.insert(older[0], summary)
+        self.summaries += 1
+
+    def _forget(self, message: BaseMessage) -> None:
+        """Account for a message leaving the history, releasing its offloaded content."""
+        self.dropped_messages += 1
+        content = self.offloaded.pop(message.additional_kwargs.get("offloaded", ""), None)
+        if content is not None:
+            self.offloaded_bytes -= len(content)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.policy.strategy,
+            "history_tokens": self.history_tokens,
+            "dropped_messages": self.dropped_messages,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+            "offloaded_messages": len(self.offloaded),
+            "offloaded_bytes": self.offloaded_bytes,
+        }
+
+
+def _is_summary(message: BaseMessage) -> bool:
+    return isinstance(message.content, str) and message.content.startswith(SUMMARY_PREFIX)
+
+
+def _transcript_line(message: BaseMessage) -> str:
+    role = "User" if isinstance(message, HumanMessage) else "Assistant"
+    return f"{role}: {message.content}"
+
+
+def aggregate_memory_stats(memories: List[SessionMemory]) -> Dict[str, Any]:
+    """Totals across sessions, plus the number of sessions per strategy."""
+    totals: Dict[str, Any] = {"strategies": {}}
+    for memory in memories:
+        stats = memory.stats()
+        strategy = stats.pop("strategy")
+        totals["strategies"][strategy] = totals["strategies"].get(strategy, 0) + 1
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
@@ -0,0 +1,170 @@
+"""
+Background jobs for long-running agent queries.
+A job runs a query in a task owned by the registry, so the HTTP request that created
+it returns at once. Clients poll the job for its status and the tool calls made so far,
+and can cancel it; cancellation interrupts the agent, including in-flight tool calls.
+Jobs that nobody polls for a while are treated as abandoned and cancelled.
+"""
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Characters of tool input and output kept per recorded tool call
+PREVIEW_CHARS = 500
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class JobLimitReached(RuntimeError):
+    """Raised when the registry is full of unfinished jobs."""
+
+
+@dataclass
+class Job:
+    """One background query and its progress."""
+    job_id: str
+    session_id: str
+    query: str
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    steps: int = 0
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+    result: Optional[str] = None
+    # Budget that stopped the run early, if any; the result is then partial
+    stop_reason: Optional[str] = None
+    error: Optional[str] = None
+    last_polled: float = field(default_factory=time.monotonic)
+    task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def mark_running(self) -> None:
+        self.status = "running"
+        self.started_at = time.time()
+
+    def record_event(self, event: str, data: Optional[dict]) -> None:
+        """Record a run event from agent_runner.stream_agent_run."""
+        if event == "step":
+            self.steps = data["step"]
+        elif event == "tool_start":
+            self.tool_calls.append({
+                "id": data["id"],
+                "tool": data["tool"],
+                "input": str(data["input"])[:PREVIEW_CHARS],
+                "status": "running",
+            })
+        elif event in ("tool_end", "tool_error"):
+            for call in reversed(self.tool_calls):
+                if call["id"] == data["id"]:
+                    if event == "tool_end":
+                        call.update(status="done", output=data["output"][:PREVIEW_CHARS])
+                    else:
+                        call.update(status="error", error=data["error"][:PREVIEW_CHARS])
+                    break
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "jobId": self.job_id,
+            "sessionId": self.session_id,
+            "query": self.query,
+            "status": self.status,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "steps": self.steps,
+            "toolCalls": [dict(call) for call in self.tool_calls],
+            "result": self.result,
+            "stopReason": self.stop_reason,
+            "error": self.error,
+        }
+
+
+class JobRegistry:
+    """
+    Owns the tasks of background jobs. Finished jobs are kept for `ttl` seconds so
+    clients can collect the result; unfinished jobs not polled for `abandon_after`
+    seconds are cancelled (0 disables).
+    """
+
+    def __init__(self, max_jobs: int, ttl: float, abandon_after: float):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.abandon_after = abandon_after
+        self._jobs: Dict[str, Job] = {}
+        self.counts: Dict[str, int] = {"submitted": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "abandoned": 0}
+
+    def submit(self, session_id: str, query: str, run: Callable[[Job], Awaitable[str]]) -> Job:
+        """Start run(job) in the background and return the job right away."""
+        self.sweep()
+        if self.max_jobs and sum(not job.finished for job in self._jobs.values()) >= self.max_jobs:
+            raise JobLimitReached("Too many jobs are running, please retry later.")
+        job = Job(job_id=f"job-{uuid.uuid4().hex}", session_id=session_id, query=query)
+        job.task = asyncio.create_task(self._run(job, run))
+        self._jobs[job.job_id] = job
+        self.counts["submitted"] += 1
+        return job
+
+    async def _run(self, job: Job, run: Callable[[Job], Awaitable[str]]) -> None:
+        try:
+            job.result = await run(job)
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e) or type(e).__name__
+        finally:
+            job.finished_at = time.time()
+            self.counts[job.status] += 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job and record that a client is still interested in it."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.last_polled = time.monotonic()
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job and wait until it has stopped. Finished jobs are returned unchanged."""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished or job.task is None:
+            return job
+        job.task.cancel()
+        await asyncio.gather(job.task, return_exceptions=True)
+        return job
+
+    def sweep(self) -> None:
+        """Forget expired finished jobs and cancel abandoned ones."""
+        now = time.monotonic()
+        wall_now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished:
+                if self.ttl and job.finished_at is not None and wall_now - job.finished_at > self.ttl:
+                    del self._jobs[job_id]
+            elif self.abandon_after and now - job.last_polled > self.abandon_after and job.task is not None:
+                self.counts["abandoned"] += 1
+                job.task.cancel()
+
+    async def close_all(self) -> None:
+        """Cancel every unfinished job."""
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "jobs": len(self._jobs),
+            "max_jobs": self.max_jobs,
+            "by_status": statuses,
+            "totals": dict(self.counts),
+        }
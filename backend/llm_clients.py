@@ -0,0 +1,139 @@
+"""
+Shared LLM clients.
+One ChatOpenAI is built per (model, base_url) pair and shared by every agent, and all of
+them send requests through a single pooled httpx client with keep-alive, optional HTTP/2
+and retries that honour 429/503 Retry-After headers.
+"""
+import asyncio
+import email.utils
+import random
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class RetryAfterTransport(httpx.AsyncBaseTransport):
+    """Transport that retries rate-limited and unavailable responses with backoff."""
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        max_retries: int,
+        backoff: float,
+        max_wait: float,
+    ):
+        self._transport = transport
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.retries = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            response = await self._transport.handle_async_request(request)
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                return response
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+            if delay > self.max_wait:
+                return response
+            await response.aclose()
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class LLMClientRegistry:
+    """Builds each (model, base_url) client once and shares one connection pool between them."""
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        http2: bool,
+        max_retries: int,
+        retry_backoff: float,
+        retry_max_wait: float,
+    ):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError as e:
+                raise ValueError("The h2 package is required for LLM_HTTP2=true (pip install 'httpx[http2]')") from e
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._transport = RetryAfterTransport(
+            httpx.AsyncHTTPTransport(limits=self.limits, http2=http2),
+            max_retries=max_retries,
+            backoff=retry_backoff,
+            max_wait=retry_max_wait,
+        )
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._clients: Dict[Tuple[str, str], ChatOpenAI] = {}
+
+    def get(self, model: str, base_url: str, api_key: str) -> ChatOpenAI:
+        """Return the shared chat model for a model and endpoint, creating it on first use."""
+        key = (model, base_url)
+        llm = self._clients.get(key)
+        if llm is None:
+            if self._http_client is None:
+                self._http_client = httpx.AsyncClient(
+                    transport=self._transport,
+                    timeout=httpx.Timeout(600.0, connect=10.0),
+                )
+            # Retries happen in the transport so Retry-After is honoured once, not per layer
+            llm = ChatOpenAI(
+                model=model,
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                http_async_client=self._http_client,
+            )
+            self._clients[key] = llm
+        return llm
+
+    async def close(self) -> None:
+        """Close the shared connection pool."""
+        self._clients.clear()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "retries": self._transport.retries,
+        }
@@ -0,0 +1,304 @@
+"""
+Prometheus-style metrics for the backend, rendered in the text exposition format.
+LLM time and agent steps are measured by a LangChain callback handler installed per
+query through a context variable; MCP tool time is measured by a tool interceptor,
+which also attributes it to the query that made the call.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+try:
+    from .conversation_memory import is_memory_call
+    from .tool_calls import ToolCallNext
+except ImportError:
+    from conversation_memory import is_memory_call
+    from tool_calls import ToolCallNext
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+STEP_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets and optional labels."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> (per-bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.read())}"]
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together on /metrics."""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+_query_metrics_handler: ContextVar[Optional["QueryMetricsHandler"]] = ContextVar(
+    "mcp_query_metrics_handler", default=None
+)
+register_configure_hook(_query_metrics_handler, inheritable=True)
+
+
+class QueryMetricsHandler(AsyncCallbackHandler):
+    """
+    Accumulate LLM time, LLM calls (agent steps) and MCP tool time for one query.
+    Memory summarization calls add to LLM time but are not agent steps.
+    """
+
+    def __init__(self, metrics: "ServiceMetrics", model: str):
+        self.metrics = metrics
+        self.model = model
+        self.llm_seconds = 0.0
+        self.tool_seconds = 0.0
+        self.steps = 0
+        # Set when a failure is reported without raising, e.g. an error event in a stream
+        self.failed = False
+        self._llm_started: Dict[Any, Tuple[float, bool]] = {}
+
+    async def on_chat_model_start(self, serialized: dict, messages: Any, *, run_id, **kwargs: Any) -> None:
+        self._llm_started[run_id] = (time.perf_counter(), is_memory_call(kwargs.get("tags")))
+
+    async def on_llm_start(self, serialized: dict, prompts: Any, *, run_id, **kwargs: Any) -> None:
+        self._llm_started[run_id] = (time.perf_counter(), is_memory_call(kwargs.get("tags")))
+
+    async def on_llm_end(self, response: Any, *, run_id, **kwargs: Any) -> None:
+        self._finish_llm_call(run_id, "ok")
+
+    async def on_llm_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+        self._finish_llm_call(run_id, "error")
+
+    def _finish_llm_call(self, run_id: Any, outcome: str) -> None:
+        started = self._llm_started.pop(run_id, None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started[0]
+        self.llm_seconds += elapsed
+        if started[1]:
+            self.metrics.memory_summary_duration.observe(elapsed, model=self.model, outcome=outcome)
+            return
+        self.steps += 1
+        self.metrics.llm_call_duration.observe(elapsed, model=self.model, outcome=outcome)
+
+
+class ServiceMetrics:
+    """The backend's metric families."""
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        register = self.registry.register
+        self.activation_duration = register(Histogram(
+            "mcp_activation_duration_seconds",
+            "Time spent activating an MCP configuration.",
+            ["outcome"],
+        ))
+        self.query_duration = register(Histogram(
+            "mcp_query_duration_seconds",
+            "End-to-end query time, including waiting for the session and a run slot.",
+            ["endpoint", "outcome"],
+        ))
+        self.query_llm_seconds = register(Histogram(
+            "mcp_query_llm_seconds",
+            "Time per query spent waiting on the LLM.",
+            ["endpoint"],
+        ))
+        self.query_tool_seconds = register(Histogram(
+            "mcp_query_tool_seconds",
+            "Time per query spent in MCP tool calls.",
+            ["endpoint"],
+        ))
+        self.query_steps = register(Histogram(
+            "mcp_query_agent_steps",
+            "Agent steps (LLM calls) per query.",
+            ["endpoint"],
+            buckets=STEP_BUCKETS,
+        ))
+        self.llm_call_duration = register(Histogram(
+            "mcp_llm_call_duration_seconds",
+            "Duration of individual LLM calls.",
+            ["model", "outcome"],
+        ))
+        self.memory_summary_duration = register(Histogram(
+            "mcp_memory_summary_duration_seconds",
+            "Duration of LLM calls that fold old turns into a session's summary.",
+            ["model", "outcome"],
+        ))
+        self.tool_call_duration = register(Histogram(
+            "mcp_tool_call_duration_seconds",
+            "Duration of individual MCP tool calls by server and tool.",
+            ["server", "tool", "outcome"],
+        ))
+        self.budget_stops = register(Counter(
+            "mcp_query_budget_stops_total",
+            "Queries stopped early because a step, token or time budget ran out.",
+            ["endpoint", "reason"],
+        ))
+        self.reaper_errors = register(Counter(
+            "mcp_reaper_errors_total",
+            "Failed idle-reaper sweeps by what was being swept.",
+            ["sweep"],
+        ))
+        self.errors = register(Counter(
+            "mcp_errors_total",
+            "Failed requests by path and exception type.",
+            ["path", "type"],
+        ))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self.registry.register(Gauge(name, documentation, read))
+
+    def record_error(self, path: str, exc: BaseException) -> None:
+        self.errors.inc(path=path, type=type(exc).__name__)
+
+    @contextmanager
+    def track_query(self, endpoint: str, model: str) -> Iterator[QueryMetricsHandler]:
+        """
+        Measure a query run in this context. LLM calls and tool calls made by the agent
+        are attributed to it; the outcome is "error" if the block raises or marks the
+        handler as failed.
+        """
+        handler = QueryMetricsHandler(self, model)
+        token = _query_metrics_handler.set(handler)
+        started = time.perf_counter()
+        raised = True
+        try:
+            yield handler
+            raised = False
+        finally:
+            outcome = "error" if raised or handler.failed else "ok"
+            try:
+                _query_metrics_handler.reset(token)
+            except ValueError:
+                # A streamed query's generator may be finalized from another context
+                pass
+            self.query_duration.observe(time.perf_counter() - started, endpoint=endpoint, outcome=outcome)
+            self.query_llm_seconds.observe(handler.llm_seconds, endpoint=endpoint)
+            self.query_tool_seconds.observe(handler.tool_seconds, endpoint=endpoint)
+            self.query_steps.observe(handler.steps, endpoint=endpoint)
+
+    async def time_tool_call(
+        self,
+        server_name: str,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        call_next: ToolCallNext,
+    ) -> Any:
+        """Tool interceptor recording per server/tool latency."""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await call_next(tool_name, arguments)
+            outcome = "error" if getattr(result, "isError", False) else "ok"
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            self.tool_call_duration.observe(elapsed, server=server_name, tool=tool_name, outcome=outcome)
+            handler = _query_metrics_handler.get()
+            if handler is not None:
+                handler.tool_seconds += elapsed
@@ -0,0 +1,278 @@
+"""
+Tiered model routing for agent steps.
+Most agent steps only pick the next tool call, which a small model does well; the answer
+the user reads benefits from a stronger one. RoutingChatModel sends each step with tools
+to the planner model first and keeps its output when it is a tool call. When the planner
+wants to answer, fails, or the run has hit repeated tool failures, the step is sent to
+the final model instead. Calls without tools (summaries, partial answers) go straight
+to the final model. Both tiers are shared clients from the LLM client registry.
+"""
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import BaseModel, ConfigDict, Field
+
+try:
+    from .conversation_memory import estimate_tokens, message_tokens
+except ImportError:
+    from conversation_memory import estimate_tokens, message_tokens
+
+# Observations mcp_use's tool adapter produces when a tool call fails
+TOOL_ERROR_PREFIXES = (
+    "Error executing MCP tool:",
+    "Error parsing result:",
+    "Error reading resource:",
+    "Error fetching prompt:",
+)
+
+
+class RoutingPolicy(BaseModel):
+    """Which model serves which agent step; sent as "routing" on activation."""
+    # Cheap model for tool-selection steps; None sends every step to the final model
+    plannerModel: Optional[str] = None
+    # Model for final answers and escalated steps; defaults to LLM_MODEL
+    finalModel: Optional[str] = None
+    # Failed tool calls in one run after which its remaining steps skip the planner (0 never)
+    escalateAfterErrors: int = Field(default=2, ge=0)
+
+
+class TierStats:
+    """Latency and token totals of one tier's model."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "average_ms": round(self.seconds / self.calls * 1000, 1) if self.calls else 0,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+class RoutingStats:
+    """Per-tier stats and escalation counts, shared by every routed session."""
+
+    def __init__(self):
+        self.tiers: Dict[Tuple[str, str], TierStats] = {}
+        self.escalations: Dict[str, int] = {}
+        self.planner_steps = 0
+
+    def record(
+        self,
+        tier: str,
+        model: str,
+        seconds: float,
+        usage: Optional[Dict[str, int]],
+        failed: bool = False,
+    ) -> None:
+        stats = self.tiers.get((tier, model))
+        if stats is None:
+            stats = self.tiers[(tier, model)] = TierStats()
+        stats.calls += 1
+        stats.seconds += seconds
+        if failed:
+            stats.errors += 1
+        if usage:
+            stats.input_tokens += usage.get("input_tokens", 0)
+            stats.output_tokens += usage.get("output_tokens", 0)
+
+    def escalate(self, reason: str) -> None:
+        self.escalations[reason] = self.escalations.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tiers": {f"{tier}:{model}": stats.to_dict() for (tier, model), stats in self.tiers.items()},
+            "planner_steps": self.planner_steps,
+            "escalations": dict(self.escalations),
+        }
+
+
+def _usage(result: ChatResult, messages: Sequence[BaseMessage]) -> Dict[str, int]:
+    """Token usage of a call as reported by the provider, or estimated from the text."""
+    message = result.generations[0].message
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return dict(usage)
+    input_tokens = sum(message_tokens(m) for m in messages)
+    output_tokens = estimate_tokens(str(message.content))
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+
+def _add_usage(result: ChatResult, extra: Dict[str, int]) -> ChatResult:
+    """Charge the tokens of a discarded planner call to the result that replaced it."""
+    message = result.generations[0].message
+    usage = dict(getattr(message, "usage_metadata", None) or {})
+    for key in ("input_tokens", "output_tokens", "total_tokens"):
+        usage[key] = usage.get(key, 0) + extra.get(key, 0)
+    message.usage_metadata = usage
+    token_usage = dict((result.llm_output or {}).get("token_usage") or {})
+    if token_usage:
+        token_usage["prompt_tokens"] = token_usage.get("prompt_tokens", 0) + extra.get("input_tokens", 0)
+        token_usage["completion_tokens"] = token_usage.get("completion_tokens", 0) + extra.get("output_tokens", 0)
+        token_usage["total_tokens"] = token_usage.get("total_tokens", 0) + extra.get("total_tokens", 0)
+        result.llm_output = {**(result.llm_output or {}), "token_usage": token_usage}
+    return result
+
+
+def _as_chunk(result: ChatResult) -> ChatGenerationChunk:
+    """Replay a planner result on the streaming path as one chunk."""
+    message = result.generations[0].message
+    return ChatGenerationChunk(message=AIMessageChunk(
+        content=message.content,
+        tool_call_chunks=[
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+            for index, call in enumerate(message.tool_calls)
+        ],
+        usage_metadata=getattr(message, "usage_metadata", None),
+    ))
+
+
+class RoutingChatModel(BaseChatModel):
+    """Chat model that routes each agent step to a planner or a final tier."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    planner: BaseChatModel
+    final: BaseChatModel
+    planner_model: str
+    final_model: str
+    escalate_after_errors: int = 2
+    routing_stats: RoutingStats = Field(default_factory=RoutingStats, exclude=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "mcp-routing"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"planner": self.planner_model, "final": self.final_model}
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[Any] = None, **kwargs: Any) -> Any:
+        # Let the final tier format the tool schemas; both tiers speak the same API
+        binding = self.final.bind_tools(tools, tool_choice=tool_choice, **kwargs)
+        return self.bind(**binding.kwargs)
+
+    def _skip_planner(self, messages: List[BaseMessage], kwargs: Dict[str, Any]) -> bool:
+        """True when the step goes straight to the final tier."""
+        if not kwargs.get("tools"):
+            # Nothing to dispatch: summaries and partial answers
+            return True
+        if self.escalate_after_errors:
+            # Tool results in the prompt all belong to the current run
+            failures = sum(
+                1 for message in messages
+                if isinstance(message, ToolMessage) and str(message.content).startswith(TOOL_ERROR_PREFIXES)
+            )
+            if failures >= self.escalate_after_errors:
+                self.routing_stats.escalate("tool_errors")
+                return True
+        return False
+
+    def _accept_plan(self, result: ChatResult) -> bool:
+        """Keep the planner's output only if it is a well-formed tool call."""
+        message = result.generations[0].message
+        if getattr(message, "invalid_tool_calls", None):
+            self.routing_stats.escalate("invalid_tool_call")
+            return False
+        if not getattr(message, "tool_calls", None):
+            self.routing_stats.escalate("final_answer")
+            return False
+        self.routing_stats.planner_steps += 1
+        return True
+
+    async def _aplan(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]],
+        kwargs: Dict[str, Any],
+    ) -> Tuple[Optional[ChatResult], Optional[Dict[str, int]]]:
+        """Run the planner; returns (result to keep or None, usage of the call)."""
+        started = time.perf_counter()
+        try:
+            result = await self.planner._agenerate(messages, stop=stop, **kwargs)
+        except Exception:
+            self.routing_stats.record("planner", self.planner_model, time.perf_counter() - started, None, failed=True)
+            self.routing_stats.escalate("planner_error")
+            return None, None
+        usage = _usage(result, messages)
+        self.routing_stats.record("planner", self.planner_model, time.perf_counter() - started, usage)
+        return (result if self._accept_plan(result) else None), usage
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        planner_usage = None
+        if not self._skip_planner(messages, kwargs):
+            result, planner_usage = await self._aplan(messages, stop, kwargs)
+            if result is not None:
+                return result
+        started = time.perf_counter()
+        try:
+            result = await self.final._agenerate(messages, stop=stop, **kwargs)
+        except Exception:
+            self.routing_stats.record("final", self.final_model, time.perf_counter() - started, None, failed=True)
+            raise
+        self.routing_stats.record("final", self.final_model, time.perf_counter() - started, _usage(result, messages))
+        return _add_usage(result, planner_usage) if planner_usage else result
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        # The planner is not streamed: its output is either a tool call, which is replayed
+        # as one chunk, or an answer that is discarded and must never reach the client.
+        if not self._skip_planner(messages, kwargs):
+            result, planner_usage = await self._aplan(messages, stop, kwargs)
+            if result is not None:
+                yield _as_chunk(result)
+                return
+            if planner_usage:
+                yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=planner_usage))
+        started = time.perf_counter()
+        usage = None
+        try:
+            async for chunk in self.final._astream(messages, stop=stop, stream_usage=True, **kwargs):
+                usage = getattr(chunk.message, "usage_metadata", None) or usage
+                yield chunk
+        except BaseException:
+            self.routing_stats.record("final", self.final_model, time.perf_counter() - started, usage, failed=True)
+            raise
+        self.routing_stats.record("final", self.final_model, time.perf_counter() - started, usage)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # The agent only runs asynchronously; synchronous calls skip routing
+        return self.final._generate(messages, stop=stop, **kwargs)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        yield from self.final._stream(messages, stop=stop, **kwargs)
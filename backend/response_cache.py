@@ -0,0 +1,118 @@
+"""
+Response cache for agent answers.
+Answers are keyed by MCP config fingerprint, model name and normalized query text.
+Backends are pluggable: an in-process LRU with TTL, or any Redis-compatible server.
+"""
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold and collapse whitespace so trivially different queries share a key."""
+    return " ".join(query.casefold().split())
+
+
+def response_cache_key(fingerprint: str, model: str, query: str) -> str:
+    """Return the cache key for a query against a config and model."""
+    payload = json.dumps([fingerprint, model, normalize_query(query)], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """Interface implemented by response cache backends."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached answer for a key, if present and fresh."""
+
+    @abstractmethod
+    async def set(self, key: str, value: str) -> None:
+        """Store an answer for the configured TTL."""
+
+    async def close(self) -> None:
+        """Release backend resources."""
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "ttl_seconds": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+class InMemoryResponseCache(ResponseCache):
+    """Size-bounded LRU cache with per-entry expiry, local to this worker."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        item = self._entries.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    async def set(self, key: str, value: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+class RedisResponseCache(ResponseCache):
+    """Cache shared across workers through a Redis-compatible server (Redis, Valkey, ...)."""
+
+    def __init__(self, ttl: float, url: str, prefix: str = "mcp:response:"):
+        super().__init__(ttl)
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ValueError("The redis package is required for MCP_RESPONSE_CACHE=redis (pip install redis)") from e
+        self.prefix = prefix
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._redis.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        await self._redis.set(self.prefix + key, value, ex=max(int(self.ttl), 1))
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_response_cache(
+    backend: str,
+    ttl: float,
+    max_entries: int,
+    redis_url: str,
+) -> Optional[ResponseCache]:
+    """Build the configured cache backend, or None when caching is off."""
+    backend = backend.lower()
+    if backend in ("", "off", "none", "false", "0"):
+        return None
+    if backend == "memory":
+        return InMemoryResponseCache(ttl=ttl, max_entries=max_entries)
+    if backend == "redis":
+        return RedisResponseCache(ttl=ttl, url=redis_url)
+    raise ValueError(f"Unknown MCP_RESPONSE_CACHE backend: {backend}")
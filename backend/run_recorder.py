@@ -0,0 +1,213 @@
+"""
+Opt-in recording of agent runs for offline profiling and regression tests.
+Each recorded query becomes one JSON lines file: a header with the query, then every
+LLM request and response and every MCP tool call with its arguments and result, each
+stamped with its offset from the start of the run, then the final answer. Prompts are
+stored incrementally: a request only carries the messages that were not already in the
+previous request. benchmarks/replay_recording.py feeds a recording back through the
+agent with the LLM and MCP servers stubbed out, so framework overhead can be measured
+without the network.
+
+Recordings contain full prompts and tool results; treat them as sensitive.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import message_to_dict
+from langchain_core.tracers.context import register_configure_hook
+
+try:
+    from .conversation_memory import is_memory_call
+    from .tool_calls import ToolCallNext
+except ImportError:
+    from conversation_memory import is_memory_call
+    from tool_calls import ToolCallNext
+
+RECORDING_VERSION = 1
+
+_recording: ContextVar[Optional["Recording"]] = ContextVar("mcp_run_recording", default=None)
+register_configure_hook(_recording, inheritable=True)
+
+
+def _tool_result(result: Any) -> Any:
+    if hasattr(result, "model_dump"):
+        return result.model_dump(mode="json", exclude_none=True)
+    return result if isinstance(result, (str, int, float, bool, list, dict, type(None))) else str(result)
+
+
+class Recording(AsyncCallbackHandler):
+    """
+    Events of one agent run, collected through LangChain callbacks and a tool interceptor.
+    Memory summarization calls are left out; a replay only runs the agent.
+    """
+
+    def __init__(self, header: Dict[str, Any]):
+        self.started = time.perf_counter()
+        self.events: List[Dict[str, Any]] = [{"type": "run", "version": RECORDING_VERSION, **header}]
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self._prompt: List[Dict[str, Any]] = []
+        self._tools: Optional[list] = None
+        self._llm_started: Dict[Any, float] = {}
+
+    def _offset_ms(self, now: Optional[float] = None) -> float:
+        return round(((now or time.perf_counter()) - self.started) * 1000, 3)
+
+    def add(self, event: str, started: Optional[float] = None, **fields: Any) -> None:
+        """Append an event stamped with its start (perf_counter) offset, or now."""
+        self.events.append({"type": event, "t": self._offset_ms(started), **fields})
+
+    async def on_chat_model_start(self, serialized: dict, messages: Any, *, run_id, **kwargs: Any) -> None:
+        if is_memory_call(kwargs.get("tags")):
+            return
+        self.llm_calls += 1
+        self._llm_started[run_id] = time.perf_counter()
+        prompt = [message_to_dict(message) for message in messages[0]]
+        shared = 0
+        while shared < min(len(prompt), len(self._prompt)) and prompt[shared] == self._prompt[shared]:
+            shared += 1
+        self._prompt = prompt
+        fields: Dict[str, Any] = {"keep": shared, "messages": prompt[shared:]}
+        tools = (kwargs.get("invocation_params") or {}).get("tools")
+        if tools != self._tools:
+            # Tool schemas only when they change, normally once per run
+            self._tools = tools
+            fields["tools"] = tools
+        self.add("llm_request", self._llm_started[run_id], **fields)
+
+    async def on_llm_end(self, response: Any, *, run_id, **kwargs: Any) -> None:
+        if is_memory_call(kwargs.get("tags")):
+            return
+        started = self._llm_started.pop(run_id, None)
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, "message", None)
+        self.add(
+            "llm_response",
+            started,
+            duration_ms=round((time.perf_counter() - started) * 1000, 3) if started else None,
+            message=message_to_dict(message) if message is not None else None,
+            token_usage=(response.llm_output or {}).get("token_usage"),
+        )
+
+    async def on_llm_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+        if is_memory_call(kwargs.get("tags")):
+            return
+        started = self._llm_started.pop(run_id, None)
+        self.add(
+            "llm_error",
+            started,
+            duration_ms=round((time.perf_counter() - started) * 1000, 3) if started else None,
+            error=str(error) or type(error).__name__,
+        )
+
+    def finish(self, result: Optional[str], stop_reason: Optional[str] = None) -> None:
+        self.add("final", duration_ms=self._offset_ms(), result=result, stop_reason=stop_reason)
+
+    def to_jsonl(self) -> str:
+        return "".join(json.dumps(event, separators=(",", ":"), ensure_ascii=False, default=str) + "\n" for event in self.events)
+
+
+class RunRecorder:
+    """Writes a recording per agent run to a directory; without a directory recording is off."""
+
+    def __init__(self, directory: str = "", sample_rate: float = 1.0):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.recorded = 0
+        self.write_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.sample_rate > 0
+
+    @asynccontextmanager
+    async def record(self, endpoint: str, session_id: str, model: str, query: str, budget: Any = None) -> AsyncIterator[Optional[Recording]]:
+        """
+        Record the agent run inside the block. Yields the Recording, on which the caller
+        calls finish() with the answer, or None when this run is not recorded.
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            yield None
+            return
+        recording = Recording({
+            "endpoint": endpoint,
+            "session_id": session_id,
+            "model": model,
+            "query": query,
+            "budget": {key: value for key, value in vars(budget).items() if value is not None} if budget else None,
+            "recorded_at": time.time(),
+        })
+        token = _recording.set(recording)
+        try:
+            yield recording
+        except BaseException as e:
+            recording.add("error", error=str(e) or type(e).__name__)
+            raise
+        finally:
+            try:
+                _recording.reset(token)
+            except ValueError:
+                pass
+            await self._write(session_id, recording)
+
+    async def _write(self, session_id: str, recording: Recording) -> None:
+        name = "{}-{}-{}.jsonl".format(
+            time.strftime("%Y%m%dT%H%M%S"),
+            re.sub(r"[^A-Za-z0-9_.-]", "_", session_id)[:64],
+            uuid.uuid4().hex[:8],
+        )
+        try:
+            await asyncio.to_thread(self._save, os.path.join(self.directory, name), recording.to_jsonl())
+            self.recorded += 1
+        except Exception:
+            # A recording is never worth failing the query for
+            self.write_errors += 1
+
+    @staticmethod
+    def _save(path: str, payload: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(payload)
+
+    async def record_tool_call(
+        self,
+        server_name: str,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        call_next: ToolCallNext,
+    ) -> Any:
+        """Tool interceptor adding each MCP tool call and its result to the current recording."""
+        recording = _recording.get()
+        if recording is None:
+            return await call_next(tool_name, arguments)
+        recording.tool_calls += 1
+        started = time.perf_counter()
+        event: Dict[str, Any] = {"server": server_name, "tool": tool_name, "arguments": arguments}
+        try:
+            result = await call_next(tool_name, arguments)
+        except BaseException as e:
+            event["error"] = str(e) or type(e).__name__
+            raise
+        else:
+            event["result"] = _tool_result(result)
+        finally:
+            # Appended once the call is over, so parallel calls appear in completion order
+            recording.add("tool_call", started, duration_ms=round((time.perf_counter() - started) * 1000, 3), **event)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "sample_rate": self.sample_rate,
+            "recorded": self.recorded,
+            "write_errors": self.write_errors,
+        }
@@ -0,0 +1,323 @@
+"""
+Session registry shared between workers.
+Each worker keeps live agents in its own SessionStore; the registry holds what is
+needed to rebuild a session anywhere: the MCP config as submitted (placeholders
+unresolved, so no secrets are stored), the model, the conversation history and a
+hint naming the worker that last served it. Backends are pluggable: an in-process
+map for a single worker, a SQLite file that survives restarts of this host, or any
+Redis-compatible server for several nodes.
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+# Identifies this process in owner hints, e.g. "web-1:4312"
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass
+class SessionRecord:
+    """Everything needed to rebuild a session on another worker."""
+    session_id: str
+    config: Dict[str, Any]
+    model: str
+    history: List[Dict[str, str]] = field(default_factory=list)
+    # The session's memory policy; None means the server default
+    memory: Optional[Dict[str, Any]] = None
+    # The session's model routing policy; None means the server default
+    routing: Optional[Dict[str, Any]] = None
+    owner: str = WORKER_ID
+    updated_at: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, payload: str) -> "SessionRecord":
+        return cls(**json.loads(payload))
+
+
+def is_newer_elsewhere(record: SessionRecord, synced_at: float) -> bool:
+    """
+    True if the record holds a turn that a copy last synced at synced_at has not seen.
+    Every write this worker makes is synced, so a mismatch means another worker wrote it;
+    a record owned by another worker counts even if its clock is behind.
+    """
+    if record.updated_at == synced_at:
+        return False
+    return record.owner != WORKER_ID or record.updated_at > synced_at
+
+
+def serialize_history(messages: List[BaseMessage]) -> List[Dict[str, str]]:
+    """Keep the user and assistant turns; the system prompt is rebuilt from the tools."""
+    history = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            history.append({"role": "user", "content": str(message.content)})
+        elif isinstance(message, AIMessage):
+            history.append({"role": "assistant", "content": str(message.content)})
+    return history
+
+
+def deserialize_history(history: List[Dict[str, str]]) -> List[BaseMessage]:
+    return [
+        HumanMessage(content=item["content"]) if item["role"] == "user" else AIMessage(content=item["content"])
+        for item in history
+    ]
+
+
+class SessionRegistry(ABC):
+    """Interface implemented by session registry backends."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.rebuilds = 0
+        # Writes skipped because another worker had stored a newer turn
+        self.conflicts = 0
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        """Return the record for a session, if it exists and has not expired."""
+
+    @abstractmethod
+    async def put(self, record: SessionRecord) -> None:
+        """Store a record, refreshing its TTL."""
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        """Forget a session."""
+
+    async def run(self) -> None:
+        """Background work while serving; most backends need none."""
+
+    async def close(self) -> None:
+        """Release backend resources."""
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "ttl_seconds": self.ttl,
+            "worker": WORKER_ID,
+            "rebuilds": self.rebuilds,
+            "conflicts": self.conflicts,
+        }
+
+
+class InMemorySessionRegistry(SessionRegistry):
+    """Registry local to this worker; lets sessions survive local eviction on a single worker."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self._records: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        item = self._records.get(session_id)
+        if item is None:
+            return None
+        if self.ttl and item[0] < time.monotonic():
+            del self._records[session_id]
+            return None
+        return SessionRecord.from_json(item[1])
+
+    async def put(self, record: SessionRecord) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else float("inf")
+        # Stored serialized so callers never share mutable state with the registry
+        self._records[record.session_id] = (expires_at, record.to_json())
+        self._records.move_to_end(record.session_id)
+        while self.max_entries and len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+
+    async def delete(self, session_id: str) -> None:
+        self._records.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "records": len(self._records), "max_entries": self.max_entries}
+
+
+class SqliteSessionRegistry(SessionRegistry):
+    """
+    Registry in a local SQLite file, so sessions survive restarts and deploys of this host.
+    Writes are buffered and flushed in one transaction every flush_interval seconds; only
+    sessions that changed since the last flush are written. A flush_interval of 0 writes
+    every record through immediately. Records are read back lazily, when a session is
+    first used after the restart.
+    """
+
+    def __init__(self, ttl: float, path: str, flush_interval: float = 5.0):
+        super().__init__(ttl)
+        self.path = path
+        self.flush_interval = flush_interval
+        # Session id -> (expires_at, record JSON), or None for a pending delete
+        self._pending: Dict[str, Optional[Tuple[float, str]]] = {}
+        # The batch being written, still served to readers until it is committed
+        self._flushing: Dict[str, Optional[Tuple[float, str]]] = {}
+        self._flush_lock = asyncio.Lock()
+        # The connection is used from worker threads, one at a time
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, record TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.flushes = 0
+        self.flush_errors = 0
+        self.written = 0
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        if session_id in self._pending:
+            item = self._pending[session_id]
+        elif session_id in self._flushing:
+            item = self._flushing[session_id]
+        else:
+            item = await asyncio.to_thread(self._read, session_id)
+        if item is None or item[0] < time.time():
+            return None
+        return SessionRecord.from_json(item[1])
+
+    async def put(self, record: SessionRecord) -> None:
+        # Wall-clock expiry, since records outlive the process
+        expires_at = time.time() + self.ttl if self.ttl else float("inf")
+        await self._queue(record.session_id, (expires_at, record.to_json()))
+
+    async def delete(self, session_id: str) -> None:
+        await self._queue(session_id, None)
+
+    async def _queue(self, session_id: str, item: Optional[Tuple[float, str]]) -> None:
+        self._pending[session_id] = item
+        if self.flush_interval <= 0:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write the sessions that changed since the last flush."""
+        # Flushes run one at a time so an older batch never overwrites a newer one
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch = self._flushing = self._pending
+            self._pending = {}
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except BaseException:
+                # Keep the batch for the next flush unless newer changes replaced it
+                self._pending = {**batch, **self._pending}
+                raise
+            finally:
+                self._flushing = {}
+            self.flushes += 1
+            self.written += len(batch)
+
+    def _read(self, session_id: str) -> Optional[Tuple[float, str]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires_at, record FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def _write(self, batch: Dict[str, Optional[Tuple[float, str]]]) -> None:
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                for session_id, item in batch.items():
+                    if item is None:
+                        self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                    else:
+                        self._db.execute(
+                            "INSERT INTO sessions (session_id, record, expires_at) VALUES (?, ?, ?) "
+                            "ON CONFLICT(session_id) DO UPDATE SET record = excluded.record, expires_at = excluded.expires_at",
+                            (session_id, item[1], item[0]),
+                        )
+                self._db.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    async def run(self) -> None:
+        """Flush periodically until cancelled."""
+        if self.flush_interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                self.flush_errors += 1
+
+    async def close(self) -> None:
+        try:
+            await self.flush()
+        finally:
+            with self._db_lock:
+                self._db.close()
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "path": self.path,
+            "flush_interval": self.flush_interval,
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "written": self.written,
+        }
+
+
+class RedisSessionRegistry(SessionRegistry):
+    """Registry shared across workers and nodes through a Redis-compatible server."""
+
+    def __init__(self, ttl: float, url: str, prefix: str = "mcp:session:"):
+        super().__init__(ttl)
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ValueError("The redis package is required for MCP_SESSION_REGISTRY=redis (pip install redis)") from e
+        self.prefix = prefix
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        payload = await self._redis.get(self.prefix + session_id)
+        return SessionRecord.from_json(payload) if payload else None
+
+    async def put(self, record: SessionRecord) -> None:
+        ttl = int(self.ttl) if self.ttl else None
+        await self._redis.set(self.prefix + record.session_id, record.to_json(), ex=ttl)
+
+    async def delete(self, session_id: str) -> None:
+        await self._redis.delete(self.prefix + session_id)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_session_registry(
+    backend: str,
+    ttl: float,
+    max_entries: int,
+    redis_url: str,
+    sqlite_path: str = "sessions.db",
+    flush_interval: float = 5.0,
+) -> Optional[SessionRegistry]:
+    """Build the configured registry backend, or None when sessions stay worker-local."""
+    backend = backend.lower()
+    if backend in ("", "off", "none", "false", "0"):
+        return None
+    if backend == "memory":
+        return InMemorySessionRegistry(ttl=ttl, max_entries=max_entries)
+    if backend == "sqlite":
+        return SqliteSessionRegistry(ttl=ttl, path=sqlite_path, flush_interval=flush_interval)
+    if backend == "redis":
+        return RedisSessionRegistry(ttl=ttl, url=redis_url)
+    raise ValueError(f"Unknown MCP_SESSION_REGISTRY backend: {backend}")
@@ -0,0 +1,185 @@
+"""
+Bounded in-memory session store.
+Sessions expire after an idle TTL, the least recently used session is evicted once
+the store is full, and sessions whose approximate footprint exceeds the per-session
+memory budget are evicted too.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from mcp_use import MCPAgent, MCPClient
+
+try:
+    from .conversation_memory import SessionMemory, aggregate_memory_stats
+    from .model_routing import RoutingPolicy
+except ImportError:
+    from conversation_memory import SessionMemory, aggregate_memory_stats
+    from model_routing import RoutingPolicy
+
+# Rough per-message overhead of a LangChain message object, in bytes
+MESSAGE_OVERHEAD_BYTES = 512
+
+
+@dataclass
+class SessionEntry:
+    """An activated session: its agent, the pooled client behind it and usage timestamps."""
+    session_id: str
+    agent: MCPAgent
+    client: MCPClient
+    fingerprint: str
+    model: str = ""
+    # The config as submitted, before ${VAR} substitution; used to rebuild the session elsewhere
+    config: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    # Serializes agent runs; the agent and its conversation memory are not safe to share
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Bounds the conversation history after every turn
+    memory: Optional[SessionMemory] = None
+    # Planner/final model tiers; None when every step uses LLM_MODEL
+    routing: Optional[RoutingPolicy] = None
+    # updated_at of the registry record this copy was last read from or written to
+    synced_at: float = 0.0
+
+    @property
+    def busy(self) -> bool:
+        """True while an agent run holds the session."""
+        return self.lock.locked()
+
+    def approx_bytes(self) -> int:
+        """Approximate memory held by the session's conversation history."""
+        total = 0
+        for message in self.agent.get_conversation_history():
+            content = message.content
+            total += MESSAGE_OVERHEAD_BYTES + len(content if isinstance(content, str) else str(content))
+        if self.memory is not None:
+            total += self.memory.offloaded_bytes
+        return total
+
+
+class SessionStore:
+    """
+    LRU-ordered session map with idle TTL, size bound and per-session memory budget.
+    on_evict is awaited with the entry and the reason whenever a session leaves the store.
+    """
+
+    def __init__(
+        self,
+        idle_ttl: float,
+        max_sessions: int,
+        memory_budget: int,
+        on_evict: Callable[[SessionEntry, str], Awaitable[None]],
+    ):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.memory_budget = memory_budget
+        self._on_evict = on_evict
+        self._sessions: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self.evictions: Dict[str, int] = {"idle": 0, "lru": 0, "memory": 0}
+        self.removed = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def ids(self) -> List[str]:
+        """Return session ids from least to most recently used."""
+        return list(self._sessions.keys())
+
+    async def put(self, entry: SessionEntry) -> None:
+        """Store a session, replacing any previous session with the same id."""
+        previous = self._sessions.pop(entry.session_id, None)
+        self._sessions[entry.session_id] = entry
+        if previous is not None:
+            await self._on_evict(previous, "replaced")
+        await self.sweep()
+
+    async def get(self, session_id: str) -> Optional[SessionEntry]:
+        """Return a live session and mark it as most recently used."""
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if self._is_idle(entry, now):
+            await self._evict(session_id, "idle")
+            return None
+        entry.last_used = now
+        self._sessions.move_to_end(session_id)
+        return entry
+
+    async def remove(self, session_id: str) -> bool:
+        """Explicitly remove a session. Returns False if it did not exist."""
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        self.removed += 1
+        await self._on_evict(entry, "removed")
+        return True
+
+    async def enforce_memory_budget(self, session_id: str) -> bool:
+        """Evict a session if it has outgrown the memory budget. Returns True if evicted."""
+        entry = self._sessions.get(session_id)
+        if entry is None or entry.busy or not self.memory_budget:
+            return False
+        if entry.approx_bytes() <= self.memory_budget:
+            return False
+        await self._evict(session_id, "memory")
+        return True
+
+    async def sweep(self) -> int:
+        """Apply idle TTL, memory budget and size bound. Returns the number of evictions."""
+        now = time.monotonic()
+        evicted = 0
+        for session_id, entry in list(self._sessions.items()):
+            if entry.busy:
+                continue
+            if self._is_idle(entry, now):
+                await self._evict(session_id, "idle")
+                evicted += 1
+            elif self.memory_budget and entry.approx_bytes() > self.memory_budget:
+                await self._evict(session_id, "memory")
+                evicted += 1
+        while self.max_sessions and len(self._sessions) > self.max_sessions:
+            oldest_id = next((sid for sid, entry in self._sessions.items() if not entry.busy), None)
+            if oldest_id is None:
+                break
+            await self._evict(oldest_id, "lru")
+            evicted += 1
+        return evicted
+
+    async def close_all(self) -> None:
+        """Release every session without counting it as an eviction."""
+        entries = list(self._sessions.values())
+        self._sessions.clear()
+        for entry in entries:
+            await self._on_evict(entry, "shutdown")
+
+    def stats(self) -> dict:
+        """Return occupancy and eviction counters."""
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "memory_budget_bytes": self.memory_budget,
+            "approx_bytes": sum(entry.approx_bytes() for entry in self._sessions.values()),
+            "evictions": dict(self.evictions),
+            "removed": self.removed,
+            "memory": aggregate_memory_stats(
+                [entry.memory for entry in self._sessions.values() if entry.memory is not None]
+            ),
+        }
+
+    def _is_idle(self, entry: SessionEntry, now: float) -> bool:
+        return bool(self.idle_ttl) and not entry.busy and now - entry.last_used > self.idle_ttl
+
+    async def _evict(self, session_id: str, reason: str) -> None:
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return
+        self.evictions[reason] += 1
+        await self._on_evict(entry, reason)
@@ -0,0 +1,169 @@
+"""
+Single-pass rewriting of agent answers.
+A rule table of phrases and their replacements is compiled, together with the sentence
+separator, into one case-insensitive alternation, so an answer is rewritten in a single
+scan. The same engine can rewrite streamed text chunk by chunk; matches that straddle
+chunk boundaries are held back until they can be decided.
+"""
+import json
+import re
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+RewriteRule = Tuple[str, str]
+
+# Phrase -> replacement. At any position the first matching rule in table order wins.
+DEFAULT_REWRITE_RULES: List[RewriteRule] = [
+    ("returned an error and is not usable", "is currently unavailable"),
+    ("returned an error", "encountered an issue"),
+    ("is not usable", "is currently unavailable"),
+    ("not usable", "unavailable"),
+    ("failed to", "could not"),
+    ("error occurred", "issue encountered"),
+    ("error:", "note:"),
+]
+
+# A period plus any run of whitespace and periods after it ends a sentence; whitespace
+# before the period is trimmed from the preceding text
+SENTENCE_SEPARATOR = r"\.[\s.]*"
+SEPARATOR_TEXT = ". "
+
+
+def load_rewrite_rules(path: str) -> List[RewriteRule]:
+    """Read a rule table from a JSON file holding a list of [phrase, replacement] pairs."""
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f)
+    if not isinstance(rules, list) or not all(
+        isinstance(rule, list) and len(rule) == 2 and all(isinstance(part, str) for part in rule)
+        for rule in rules
+    ):
+        raise ValueError(f"{path} must contain a JSON list of [phrase, replacement] pairs")
+    return [(phrase, replacement) for phrase, replacement in rules]
+
+
+def _validate_rule(phrase: str, replacement: str) -> None:
+    # Rules must not interact with sentence splitting, or one pass would differ from
+    # replacing first and splitting afterwards
+    for part in (phrase, replacement):
+        if not part or part != part.strip() or "." in part:
+            raise ValueError(
+                f"Rewrite rule parts must be non-empty, without periods or surrounding whitespace: {part!r}"
+            )
+
+
+class ResponseRewriter:
+    """
+    Replaces rule phrases case-insensitively, collapses each sentence separator to ". "
+    and drops separators and whitespace at both ends of the text.
+    """
+
+    def __init__(self, rules: Sequence[RewriteRule] = DEFAULT_REWRITE_RULES):
+        for phrase, replacement in rules:
+            _validate_rule(phrase, replacement)
+        self.rules = list(rules)
+        # Matching runs on a lowercased copy of the text, which is much faster than
+        # IGNORECASE; the fallback pattern covers text whose length changes when lowercased
+        self._replacements: Dict[str, str] = {}
+        for phrase, replacement in self.rules:
+            self._replacements.setdefault(phrase.lower(), replacement)
+        alternatives = [re.escape(phrase) for phrase in self._replacements] + [SENTENCE_SEPARATOR]
+        self._pattern = re.compile("|".join(alternatives))
+        self._ignorecase_pattern = re.compile("|".join(alternatives), re.IGNORECASE)
+        # Longest text a rule match can span; streamed text closer than this to the end is held back
+        self.max_phrase_length = max((len(phrase) for phrase in self._replacements), default=1)
+
+    def rewrite(self, text: str) -> str:
+        """Rewrite a complete text."""
+        if not text:
+            return text
+        rewritten, _, _ = self._rewrite_span(text, len(text), final=True, started=False)
+        return rewritten.strip()
+
+    def stream(self) -> "StreamingRewriter":
+        """Return a rewriter for one text that arrives in chunks."""
+        return StreamingRewriter(self)
+
+    def _matches(self, text: str) -> Iterator[re.Match]:
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            return self._pattern.finditer(lowered)
+        return self._ignorecase_pattern.finditer(text)
+
+    def _rewrite_span(self, text: str, cut: int, final: bool, started: bool) -> Tuple[str, int, bool]:
+        """
+        Rewrite the matches of text that start before cut. Returns the rewritten text, the
+        position up to which text was consumed and whether any content has been produced.
+        """
+        replacements = self._replacements
+        end = len(text)
+        parts: List[str] = []
+        position = 0
+        for match in self._matches(text):
+            match_start = match.start()
+            if match_start >= cut:
+                break
+            literal = text[position:match_start]
+            matched = match.group()
+            if matched[0] == ".":
+                literal = literal.rstrip()
+                parts.append(literal)
+                started = started or bool(literal)
+                at_end = final and match.end() == end
+                parts.append(SEPARATOR_TEXT if started and not at_end else "")
+            else:
+                parts.append(literal)
+                parts.append(replacements[matched.lower()])
+                started = True
+            position = match.end()
+        if position < cut:
+            literal = text[position:cut]
+            parts.append(literal)
+            started = started or not literal.isspace()
+            position = cut
+        return "".join(parts), position, started
+
+
+class StreamingRewriter:
+    """
+    Incremental form of ResponseRewriter.rewrite: the concatenation of everything
+    returned by feed() and flush() equals rewrite() of the concatenated input.
+    """
+
+    def __init__(self, rewriter: ResponseRewriter):
+        self._rewriter = rewriter
+        self._buffer = ""
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk; return the rewritten text that can no longer change."""
+        buffer = self._buffer + chunk
+        # Hold back anything that could still be the start of a rule phrase, and the
+        # whitespace/period run around the cut: it may grow into a separator or be trailing
+        cut = len(buffer) - (self._rewriter.max_phrase_length - 1)
+        while cut > 0 and (buffer[cut - 1] == "." or buffer[cut - 1].isspace()):
+            cut -= 1
+        if cut <= 0:
+            self._buffer = buffer
+            return ""
+        return self._emit(buffer, cut, final=False)
+
+    def flush(self) -> str:
+        """Return whatever is still held back; the text is complete."""
+        if not self._buffer:
+            return ""
+        return self._emit(self._buffer, len(self._buffer), final=True)
+
+    def _emit(self, buffer: str, cut: int, final: bool) -> str:
+        was_started = self._started
+        text, position, self._started = self._rewriter._rewrite_span(buffer, cut, final, was_started)
+        self._buffer = buffer[position:]
+        if not was_started:
+            # Leading whitespace of the whole text is dropped
+            text = text.lstrip()
+        if final:
+            text = text.rstrip()
+        return text
+
+
+def create_response_rewriter(rules_path: Optional[str] = None) -> ResponseRewriter:
+    """Build the rewriter from a JSON rule file, or from the default rules."""
+    return ResponseRewriter(load_rewrite_rules(rules_path) if rules_path else DEFAULT_REWRITE_RULES)
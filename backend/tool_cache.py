@@ -0,0 +1,92 @@
+"""
+Memoization of idempotent MCP tool calls.
+Servers opt tools in through a "cacheTools" map in their mcpServers entry, giving
+each tool its own TTL in seconds, e.g. {"cacheTools": {"firecrawl_scrape": 3600}}.
+Results are shared across agent runs and sessions of the same server config.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from .tool_calls import ToolCallNext, ToolInterceptor
+except ImportError:
+    from tool_calls import ToolCallNext, ToolInterceptor
+
+
+def canonical_arguments(arguments: Dict[str, Any]) -> str:
+    """Serialize tool arguments so equal argument dicts produce equal strings."""
+    return json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def server_identity(server_config: Dict[str, Any]) -> str:
+    """Hash a server config; servers with different commands or credentials never share results."""
+    return hashlib.sha256(canonical_arguments(server_config).encode("utf-8")).hexdigest()
+
+
+class ToolResultCache:
+    """Size-bounded LRU of tool results with per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, identity: str, server_name: str, tool_name: str, arguments: Dict[str, Any]) -> str:
+        payload = "\x1f".join((identity, server_name, tool_name, canonical_arguments(arguments)))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._entries.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: str, result: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def interceptor_for(self, server_config: Dict[str, Any]) -> Optional[ToolInterceptor]:
+        """Return a caching interceptor for a server, or None if it allowlists no tools."""
+        ttls = {name: float(ttl) for name, ttl in (server_config.get("cacheTools") or {}).items() if ttl}
+        if not ttls:
+            return None
+        identity = server_identity(server_config)
+
+        async def cache_tool_call(
+            server_name: str,
+            tool_name: str,
+            arguments: Dict[str, Any],
+            call_next: ToolCallNext,
+        ) -> Any:
+            ttl = ttls.get(tool_name)
+            if ttl is None:
+                return await call_next(tool_name, arguments)
+            key = self.key(identity, server_name, tool_name, arguments)
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            result = await call_next(tool_name, arguments)
+            if not getattr(result, "isError", False):
+                self.set(key, result, ttl)
+            return result
+
+        return cache_tool_call
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,77 @@
+"""
+Interception of MCP tool calls.
+Every tool call the agent makes goes through its connector's call_tool. Interceptors
+wrap that method in a chain so cross-cutting behaviour (caching, timing, ...) can be
+added per server without touching mcp_use internals.
+Cancelled tool calls are also reported to the server, so it can stop working on them.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List
+
+from mcp import ClientSession
+from mcp.types import CallToolRequest, CancelledNotification, CancelledNotificationParams, ClientNotification
+from mcp_use.connectors.base import BaseConnector
+
+# Seconds allowed for telling a server that a call was cancelled
+CANCEL_NOTIFY_TIMEOUT = 5.0
+
+# (tool_name, arguments) -> CallToolResult
+ToolCallNext = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+# (server_name, tool_name, arguments, call_next) -> CallToolResult
+ToolInterceptor = Callable[[str, str, Dict[str, Any], ToolCallNext], Awaitable[Any]]
+# (server_name, server_config) -> interceptors for that server, outermost first
+InterceptorFactory = Callable[[str, Dict[str, Any]], List[ToolInterceptor]]
+
+
+def install_interceptors(server_name: str, connector: BaseConnector, interceptors: List[ToolInterceptor]) -> None:
+    """Wrap a connector's call_tool so each call runs through the interceptors in order."""
+    if not interceptors:
+        return
+    original = connector.call_tool
+
+    async def call_tool(name: str, arguments: Dict[str, Any], read_timeout_seconds=None) -> Any:
+        async def call_server(tool_name: str, tool_arguments: Dict[str, Any]) -> Any:
+            return await original(tool_name, tool_arguments, read_timeout_seconds)
+
+        handler = call_server
+        for interceptor in reversed(interceptors):
+            handler = _bind(interceptor, server_name, handler)
+        return await handler(name, arguments)
+
+    connector.call_tool = call_tool
+
+
+def _bind(interceptor: ToolInterceptor, server_name: str, call_next: ToolCallNext) -> ToolCallNext:
+    async def handler(tool_name: str, arguments: Dict[str, Any]) -> Any:
+        return await interceptor(server_name, tool_name, arguments, call_next)
+    return handler
+
+
+def propagate_cancellation(client_session: ClientSession) -> None:
+    """
+    Send notifications/cancelled to the server when a tools/call request is cancelled.
+    The MCP client only stops waiting for the response; without the notification the
+    server keeps running the tool. Opt-in, as some servers exit when they receive it.
+    """
+    original = client_session.send_request
+
+    async def send_request(request: Any, result_type: Any, *args: Any, **kwargs: Any) -> Any:
+        # send_request takes the next id before it first yields, so this is the id it will use
+        request_id = client_session._request_id
+        try:
+            return await original(request, result_type, *args, **kwargs)
+        except asyncio.CancelledError:
+            if isinstance(getattr(request, "root", None), CallToolRequest):
+                notification = ClientNotification(CancelledNotification(
+                    method="notifications/cancelled",
+                    params=CancelledNotificationParams(requestId=request_id, reason="Cancelled by the client"),
+                ))
+                try:
+                    await asyncio.wait_for(
+                        asyncio.shield(client_session.send_notification(notification)), CANCEL_NOTIFY_TIMEOUT
+                    )
+                except Exception:
+                    pass
+            raise
+
+    client_session.send_request = send_request
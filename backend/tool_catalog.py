@@ -0,0 +1,137 @@
+"""
+Persistent catalog of MCP tool schemas.
+Discovery (tools/list, resources/list, prompts/list) runs once per server build; the
+results are stored on disk keyed by the server's command, args or URL and the name and
+version it reports in the initialize handshake. Warm activations then complete the
+handshake and take the schemas from the catalog instead of listing them again.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from mcp.types import Implementation, Prompt, Resource, Tool
+
+
+def catalog_key(server_config: Dict[str, Any], server_info: Optional[Implementation]) -> str:
+    """Identify a server build; env is left out so secrets never reach the key or the file."""
+    identity = {
+        "command": server_config.get("command"),
+        "args": server_config.get("args") or [],
+        "url": server_config.get("url") or server_config.get("ws_url"),
+        "server": server_info.name if server_info else None,
+        "version": server_info.version if server_info else None,
+    }
+    payload = json.dumps(identity, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ToolCatalog:
+    """Tool, resource and prompt schemas per server build, persisted as one JSON file."""
+
+    def __init__(self, path: str, ttl: float = 7 * 86400, max_entries: int = 1000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.write_errors = 0
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self._write_lock = asyncio.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            # A missing or unreadable catalog only means servers are discovered again
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self, snapshot: str) -> None:
+        # Write to a temporary file and rename it, so readers never see a partial catalog
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tool_catalog.")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl and entry.get("stored_at", 0) + self.ttl < time.time():
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def put(self, key: str, entry: Dict[str, Any]) -> None:
+        self._entries[key] = {**entry, "stored_at": time.time()}
+        if self.max_entries and len(self._entries) > self.max_entries:
+            oldest = sorted(self._entries, key=lambda k: self._entries[k].get("stored_at", 0))
+            for stale in oldest[: len(self._entries) - self.max_entries]:
+                del self._entries[stale]
+        snapshot = json.dumps(self._entries, separators=(",", ":"))
+        async with self._write_lock:
+            try:
+                await asyncio.to_thread(self._save, snapshot)
+            except OSError:
+                self.write_errors += 1
+
+    async def initialize_session(self, session: Any, server_config: Dict[str, Any]) -> bool:
+        """
+        Connect and initialize an mcp_use MCPSession like MCPSession.initialize(), taking
+        the tool, resource and prompt lists from the catalog when this server build is known.
+        Returns whether the catalog was used.
+        """
+        connector = session.connector
+        if not session.is_connected:
+            await session.connect()
+        result = await connector.client_session.initialize()
+        # Mirror what BaseConnector.initialize() records
+        connector._initialized = True
+        session.session_info = result
+
+        key = catalog_key(server_config, result.serverInfo)
+        entry = self.get(key)
+        if entry is not None:
+            connector._tools = [Tool.model_validate(item) for item in entry["tools"]]
+            connector._resources = [Resource.model_validate(item) for item in entry["resources"]]
+            connector._prompts = [Prompt.model_validate(item) for item in entry["prompts"]]
+            return True
+
+        capabilities = result.capabilities
+        client_session = connector.client_session
+        tools: List[Tool] = (await client_session.list_tools()).tools if capabilities.tools else []
+        resources: List[Resource] = (
+            (await client_session.list_resources()).resources if capabilities.resources else []
+        )
+        prompts: List[Prompt] = (await client_session.list_prompts()).prompts if capabilities.prompts else []
+        connector._tools, connector._resources, connector._prompts = tools, resources, prompts
+        await self.put(key, {
+            "server": result.serverInfo.name,
+            "version": result.serverInfo.version,
+            "tools": [item.model_dump(mode="json", by_alias=True, exclude_none=True) for item in tools],
+            "resources": [item.model_dump(mode="json", by_alias=True, exclude_none=True) for item in resources],
+            "prompts": [item.model_dump(mode="json", by_alias=True, exclude_none=True) for item in prompts],
+        })
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "write_errors": self.write_errors,
+        }
@@ -0,0 +1,87 @@
+"""
+Concurrency limits for MCP tool calls.
+When the LLM asks for several tools in one step, the agent executor runs them at once
+(asyncio.gather) and returns their results in the order they were requested. Not every
+server copes with parallel requests, so each running server gets a semaphore sized by
+the "maxConcurrency" key of its mcpServers entry, e.g. {"maxConcurrency": 1} for a
+single-threaded stdio server. Parallel execution can also be switched off, in which
+case the tool calls of a run are made one at a time.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Optional
+
+try:
+    from .tool_calls import ToolCallNext, ToolInterceptor
+except ImportError:
+    from tool_calls import ToolCallNext, ToolInterceptor
+
+_run_lock: ContextVar[Optional[asyncio.Lock]] = ContextVar("mcp_tool_run_lock", default=None)
+_UNLIMITED = nullcontext()
+
+
+class ToolConcurrencyLimiter:
+    """Per-server semaphores for tool calls, plus the parallel/sequential switch."""
+
+    def __init__(self, max_per_server: int, parallel: bool = True):
+        self.max_per_server = max_per_server
+        self.parallel = parallel
+        self.calls = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def run_scope(self) -> AsyncIterator[None]:
+        """Scope of one agent run; in sequential mode its tool calls take turns."""
+        if self.parallel:
+            yield
+            return
+        token = _run_lock.set(asyncio.Lock())
+        try:
+            yield
+        finally:
+            try:
+                _run_lock.reset(token)
+            except ValueError:
+                # A streamed query's generator may be finalized from another context
+                pass
+
+    def interceptor_for(self, server_config: Dict[str, Any]) -> Optional[ToolInterceptor]:
+        """
+        Return an interceptor limiting concurrent calls to one running server, or None if
+        calls are unlimited. Called once per server start, so each process gets its own limit.
+        """
+        limit = int(server_config.get("maxConcurrency") or self.max_per_server)
+        semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+        if semaphore is None and self.parallel:
+            return None
+
+        async def limit_tool_call(
+            server_name: str,
+            tool_name: str,
+            arguments: Dict[str, Any],
+            call_next: ToolCallNext,
+        ) -> Any:
+            self.calls += 1
+            run_lock = _run_lock.get()
+            waiting = (run_lock is not None and run_lock.locked()) or (semaphore is not None and semaphore.locked())
+            started = time.perf_counter()
+            # The run lock is always taken first, so the two cannot deadlock
+            async with run_lock or _UNLIMITED, semaphore or _UNLIMITED:
+                if waiting:
+                    self.waits += 1
+                    self.wait_seconds += time.perf_counter() - started
+                return await call_next(tool_name, arguments)
+
+        return limit_tool_call
+
+    def stats(self) -> dict:
+        return {
+            "parallel": self.parallel,
+            "max_per_server": self.max_per_server,
+            "calls": self.calls,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
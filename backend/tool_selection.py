@@ -0,0 +1,157 @@
+"""
+Per-query tool pre-selection.
+Every tool schema is sent to the LLM on every agent step, so large servers add a fixed
+token cost that grows with the step count. A local BM25 index over tool names,
+descriptions and parameters picks the top-k tools for a query, and the agent runs with
+only those for that query.
+"""
+import math
+import re
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Sequence, Tuple
+
+from mcp_use import MCPAgent
+
+_WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do for from how i in is it me my of on or please "
+    "show tell that the this to use what when where which who with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms; snake_case and camelCase names are split into words."""
+    return [term for term in (word.lower() for word in _WORD.findall(text or "")) if term not in _STOPWORDS]
+
+
+def tool_document(tool: Any) -> List[str]:
+    """Terms describing a LangChain tool: its name (weighted twice), description and parameters."""
+    name_terms = tokenize(tool.name)
+    terms = name_terms + name_terms + tokenize(tool.description or "")
+    for param, schema in (getattr(tool, "args", None) or {}).items():
+        terms += tokenize(param)
+        if isinstance(schema, dict):
+            terms += tokenize(str(schema.get("description", "")))
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over a small, fixed set of documents."""
+
+    def __init__(self, documents: Sequence[List[str]], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_counts = [Counter(document) for document in documents]
+        self._lengths = [len(document) for document in documents]
+        self._average_length = (sum(self._lengths) / len(documents)) if documents else 0.0
+        document_frequency: Counter = Counter()
+        for counts in self._term_counts:
+            document_frequency.update(counts.keys())
+        total = len(documents)
+        self._idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query_terms: Sequence[str]) -> List[float]:
+        results = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self._average_length or 1))
+            score = 0.0
+            for term in query_terms:
+                frequency = counts.get(term)
+                if frequency:
+                    score += self._idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            results.append(score)
+        return results
+
+
+class ToolSelector:
+    """Chooses the top_k tools for a query; indexes are cached per tool set."""
+
+    def __init__(self, top_k: int, max_indexes: int = 64):
+        self.top_k = top_k
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[Tuple[Tuple[str, str], ...], BM25Index]" = OrderedDict()
+        self.selections = 0
+        self.fallbacks = 0
+        self.tools_offered = 0
+        self.tools_selected = 0
+
+    def _index_for(self, tools: Sequence[Any]) -> BM25Index:
+        signature = tuple((tool.name, tool.description or "") for tool in tools)
+        index = self._indexes.get(signature)
+        if index is None:
+            index = BM25Index([tool_document(tool) for tool in tools])
+            self._indexes[signature] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(signature)
+        return index
+
+    def select(self, query: str, tools: Sequence[Any]) -> List[Any]:
+        """
+        Return the highest scoring tools, at most top_k, in their original order. All tools
+        are kept when there are no more than top_k or none of them matches the query.
+        """
+        tools = list(tools)
+        if self.top_k <= 0 or len(tools) <= self.top_k:
+            return tools
+        scores = self._index_for(tools).scores(tokenize(query))
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        self.selections += 1
+        self.tools_offered += len(tools)
+        if not ranked:
+            self.fallbacks += 1
+            self.tools_selected += len(tools)
+            return tools
+        chosen = sorted(ranked[: self.top_k])
+        self.tools_selected += len(chosen)
+        return [tools[i] for i in chosen]
+
+    @asynccontextmanager
+    async def restrict(self, agent: MCPAgent, query: str) -> AsyncIterator[None]:
+        """
+        Run the block with the agent limited to the tools selected for the query.
+        The agent's prompt and executor are rebuilt for the subset and restored afterwards;
+        callers must hold the session lock so no other run sees the restricted agent.
+        """
+        if self.top_k <= 0:
+            yield
+            return
+        initialized = agent._initialized
+        if not initialized:
+            try:
+                await agent.initialize()
+                initialized = True
+            except Exception:
+                # The run initializes again and reports the failure the usual way
+                pass
+        if not initialized:
+            yield
+            return
+        all_tools = agent._tools
+        selected = self.select(query, all_tools)
+        if len(selected) == len(all_tools):
+            yield
+            return
+        executor = agent._agent_executor
+        agent._tools = selected
+        await agent._create_system_message_from_tools(selected)
+        agent._agent_executor = agent._create_agent()
+        try:
+            yield
+        finally:
+            agent._tools = all_tools
+            await agent._create_system_message_from_tools(all_tools)
+            agent._agent_executor = executor
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "top_k": self.top_k,
+            "selections": self.selections,
+            "fallbacks": self.fallbacks,
+            "average_offered": round(self.tools_offered / self.selections, 2) if self.selections else 0,
+            "average_selected": round(self.tools_selected / self.selections, 2) if self.selections else 0,
+        }
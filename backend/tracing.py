@@ -0,0 +1,476 @@
+"""
+Request-scoped tracing with OpenTelemetry-compatible spans.
+Each query gets a root span. A LangChain callback handler installed through a context
+variable adds a span per agent step with its LLM call under it, and a tool interceptor
+adds a span per MCP tool call under the step that made it, annotated with the server
+and tool names and payload sizes. Finished spans are exported in batches using the
+OTLP/JSON encoding, either to a JSON lines file or to an OTLP/HTTP collector.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+try:
+    from .conversation_memory import SUMMARY_RUN_NAME, is_memory_call
+    from .tool_calls import ToolCallNext
+except ImportError:
+    from conversation_memory import SUMMARY_RUN_NAME, is_memory_call
+    from tool_calls import ToolCallNext
+
+# OTLP span kinds and status codes
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("mcp_current_span", default=None)
+_trace_handler: ContextVar[Optional["TraceHandler"]] = ContextVar("mcp_trace_handler", default=None)
+register_configure_hook(_trace_handler, inheritable=True)
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # int64 values are strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _encode_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Span:
+    """One timed operation of a trace."""
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        trace_id: str,
+        parent_span_id: str = "",
+        kind: int = KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: Any) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = str(error)
+        if isinstance(error, BaseException):
+            self.attributes["error.type"] = type(error).__name__
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer._finish(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _encode_attributes(self.attributes),
+            "status": {"code": self.status, "message": self.status_message} if self.status_message else {"code": self.status},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off, so callers need no checks."""
+    trace_id = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, error: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span() -> Optional["Span"]:
+    """The span of the block being traced in this context, if any."""
+    return _current_span.get()
+
+
+@contextmanager
+def child_span(
+    name: str,
+    kind: int = KIND_INTERNAL,
+    attributes: Optional[Dict[str, Any]] = None,
+    parent: Optional["Span"] = None,
+) -> Iterator[Any]:
+    """Trace the block as a child of parent (default: the current span); a no-op outside a trace."""
+    parent = parent or _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    span = parent.tracer.start_span(name, parent, kind=kind, attributes=attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def _payload_bytes(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    try:
+        return len(json.dumps(value, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(str(value).encode("utf-8"))
+
+
+def _token_usage(response: Any) -> Dict[str, int]:
+    """Prompt and completion tokens of an LLM call, if the provider reported them."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage.get("prompt_tokens") is not None:
+        return {"input": usage["prompt_tokens"], "output": usage.get("completion_tokens", 0)}
+    totals: Dict[str, int] = {}
+    for batch in response.generations:
+        for generation in batch:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                totals["input"] = totals.get("input", 0) + metadata.get("input_tokens", 0)
+                totals["output"] = totals.get("output", 0) + metadata.get("output_tokens", 0)
+    return totals
+
+
+class TraceHandler(AsyncCallbackHandler):
+    """
+    Turn the LLM calls of one query into spans. Every LLM call starts a new agent step;
+    the step stays open while the tools it asked for run, so their spans nest under it.
+    """
+
+    def __init__(self, tracer: "Tracer", root: Span, model: str):
+        self.tracer = tracer
+        self.root = root
+        self.model = model
+        self.steps = 0
+        self.current_step: Optional[Span] = None
+        self._llm_spans: Dict[Any, Span] = {}
+
+    async def on_chat_model_start(self, serialized: dict, messages: Any, *, run_id, **kwargs: Any) -> None:
+        if is_memory_call(kwargs.get("tags")):
+            # Memory upkeep after the answer: a span of its own under the request, not a step
+            name, parent = SUMMARY_RUN_NAME, self.root
+        else:
+            self._end_step()
+            self.steps += 1
+            self.current_step = self.tracer.start_span("agent.step", self.root, attributes={"agent.step": self.steps})
+            name, parent = "llm.chat", self.current_step
+        self._llm_spans[run_id] = self.tracer.start_span(
+            name,
+            parent,
+            kind=KIND_CLIENT,
+            attributes={
+                "gen_ai.operation.name": "chat",
+                "gen_ai.request.model": self.model,
+                "llm.request.messages": sum(len(batch) for batch in messages),
+                "llm.request.bytes": sum(
+                    _payload_bytes(message.content) for batch in messages for message in batch
+                ),
+            },
+        )
+
+    async def on_llm_end(self, response: Any, *, run_id, **kwargs: Any) -> None:
+        span = self._llm_spans.pop(run_id, None)
+        if span is None:
+            return
+        generations = [generation for batch in response.generations for generation in batch]
+        tool_calls = [
+            call for generation in generations
+            for call in (getattr(getattr(generation, "message", None), "tool_calls", None) or [])
+        ]
+        usage = _token_usage(response)
+        span.set_attribute("gen_ai.usage.input_tokens", usage.get("input"))
+        span.set_attribute("gen_ai.usage.output_tokens", usage.get("output"))
+        span.set_attribute("llm.response.bytes", sum(_payload_bytes(g.text) for g in generations) + _payload_bytes(tool_calls))
+        span.set_attribute("llm.response.tool_calls", len(tool_calls))
+        span.status = STATUS_OK
+        span.end()
+
+    async def on_llm_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+        span = self._llm_spans.pop(run_id, None)
+        if span is not None:
+            span.record_error(error)
+            span.end()
+
+    def _end_step(self) -> None:
+        if self.current_step is not None:
+            self.current_step.end()
+            self.current_step = None
+
+    def close(self) -> None:
+        """End the spans still open when the query finishes."""
+        for span in self._llm_spans.values():
+            span.record_error("LLM call did not finish")
+            span.end()
+        self._llm_spans.clear()
+        self._end_step()
+        self.root.set_attribute("agent.steps", self.steps)
+
+
+class FileSpanExporter:
+    """Appends each batch as one line of OTLP/JSON, the format of the collector's otlpjsonfile receiver."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _append(self, line: str) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    async def export(self, payload: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._append, json.dumps(payload, separators=(",", ":")))
+
+    async def close(self) -> None:
+        pass
+
+
+class OTLPHttpSpanExporter:
+    """Posts batches to an OTLP/HTTP collector endpoint (e.g. http://localhost:4318/v1/traces) as JSON."""
+
+    def __init__(self, endpoint: str, headers: Optional[Dict[str, str]] = None, timeout: float = 10.0):
+        self.endpoint = endpoint
+        self._client = httpx.AsyncClient(headers=headers or {}, timeout=timeout)
+
+    async def export(self, payload: Dict[str, Any]) -> None:
+        response = await self._client.post(self.endpoint, json=payload)
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class Tracer:
+    """Creates spans and exports finished ones in batches. Without an exporter tracing is off."""
+
+    def __init__(self, exporter: Any = None, service_name: str = "mcp-backend", max_pending: int = 10000):
+        self.exporter = exporter
+        self.service_name = service_name
+        self.max_pending = max_pending
+        self._pending: List[Span] = []
+        self.exported = 0
+        self.dropped = 0
+        self.export_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_span(
+        self,
+        name: str,
+        parent: Optional[Span],
+        kind: int = KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> Span:
+        """Start a span under parent (a new trace if None); the caller ends it."""
+        if parent is None:
+            return Span(self, name, os.urandom(16).hex(), kind=kind, attributes=attributes)
+        return Span(self, name, parent.trace_id, parent.span_id, kind=kind, attributes=attributes)
+
+    @contextmanager
+    def span(self, name: str, kind: int = KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """Trace the block as a child of the current span, or as a new trace."""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = self.start_span(name, _current_span.get(), kind=kind, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # A streamed query's generator may be finalized from another context
+                pass
+            span.end()
+
+    @contextmanager
+    def trace_request(
+        self,
+        name: str,
+        model: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        traceparent: Optional[str] = None,
+    ) -> Iterator[Any]:
+        """
+        Trace a request as a root span, continuing the caller's trace if a W3C traceparent
+        header is given. Agent steps, LLM calls, tool calls and server startups made in
+        the block nest under it.
+        """
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        match = _TRACEPARENT.match((traceparent or "").strip().lower())
+        if match:
+            root = Span(self, name, match.group(1), match.group(2), kind=KIND_SERVER, attributes=attributes)
+        else:
+            root = self.start_span(name, None, kind=KIND_SERVER, attributes=attributes)
+        handler = TraceHandler(self, root, model)
+        span_token = _current_span.set(root)
+        handler_token = _trace_handler.set(handler)
+        try:
+            yield root
+        except BaseException as e:
+            root.record_error(e)
+            raise
+        finally:
+            for var, token in ((_trace_handler, handler_token), (_current_span, span_token)):
+                try:
+                    var.reset(token)
+                except ValueError:
+                    pass
+            handler.close()
+            root.end()
+
+    async def trace_tool_call(
+        self,
+        server_name: str,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        call_next: ToolCallNext,
+    ) -> Any:
+        """Tool interceptor recording a span per MCP tool call under the agent step that made it."""
+        handler = _trace_handler.get()
+        parent = (handler.current_step or handler.root) if handler is not None else _current_span.get()
+        if not self.enabled or parent is None:
+            return await call_next(tool_name, arguments)
+        span = self.start_span("mcp.tool_call", parent, kind=KIND_CLIENT, attributes={
+            "mcp.server": server_name,
+            "mcp.tool": tool_name,
+            "mcp.request.bytes": _payload_bytes(arguments),
+        })
+        try:
+            result = await call_next(tool_name, arguments)
+            content = getattr(result, "content", None)
+            span.set_attribute("mcp.response.bytes", _payload_bytes(
+                [item.model_dump(mode="json") for item in content] if content else result
+            ))
+            if getattr(result, "isError", False):
+                span.record_error("Tool returned an error")
+            else:
+                span.status = STATUS_OK
+            return result
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end()
+
+    def _finish(self, span: Span) -> None:
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append(span)
+
+    async def flush(self) -> None:
+        """Export the spans finished since the last flush."""
+        if not self._pending or self.exporter is None:
+            return
+        spans, self._pending = self._pending, []
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": _encode_attributes({"service.name": self.service_name})},
+            "scopeSpans": [{
+                "scope": {"name": "mcp-backend"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]}
+        try:
+            await self.exporter.export(payload)
+            self.exported += len(spans)
+        except Exception:
+            # Traces are best effort; a collector outage must not affect queries
+            self.export_errors += 1
+            self.dropped += len(spans)
+
+    async def run(self, interval: float) -> None:
+        """Flush periodically until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def close(self) -> None:
+        await self.flush()
+        if self.exporter is not None:
+            await self.exporter.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "exporter": type(self.exporter).__name__ if self.exporter else None,
+            "pending": len(self._pending),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "export_errors": self.export_errors,
+        }
+
+
+def parse_headers(value: str) -> Dict[str, str]:
+    """Parse "key=value,key2=value2" as used by OTEL_EXPORTER_OTLP_HEADERS."""
+    headers = {}
+    for pair in value.split(","):
+        if "=" in pair:
+            key, _, val = pair.partition("=")
+            headers[key.strip()] = val.strip()
+    return headers
+
+
+def create_tracer(mode: str, file_path: str, otlp_endpoint: str, otlp_headers: str, service_name: str) -> Tracer:
+    """Build the tracer for MCP_TRACING: off, file or otlp."""
+    mode = (mode or "off").lower()
+    if mode in ("", "off", "none", "false", "0"):
+        return Tracer(None, service_name)
+    if mode == "file":
+        return Tracer(FileSpanExporter(file_path), service_name)
+    if mode == "otlp":
+        return Tracer(OTLPHttpSpanExporter(otlp_endpoint, parse_headers(otlp_headers)), service_name)
+    raise ValueError(f"Unknown MCP_TRACING mode: {mode} (expected off, file or otlp)")
@@ -7,14 +7,21 @@ if (!BACKEND_URL) {
 
 export async function POST(request: NextRequest) {
   try {
-    const body = await request.json();
+    // Forwarded as received; parsing and re-serializing it would only cost time
+    const body = await request.text();
 
-    const response = await fetch(`${BACKEND_URL}/api/mcp/query`, {
+    // Clients asking for Server-Sent Events get the backend stream passed through as-is
+    const wantsStream = request.headers.get('accept')?.includes('text/event-stream') ?? false;
+    const backendPath = wantsStream ? '/api/mcp/query/stream' : '/api/mcp/query';
+
+    const response = await fetch(`${BACKEND_URL}${backendPath}`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        ...(wantsStream ? { Accept: 'text/event-stream' } : {}),
       },
-      body: JSON.stringify(body),
+      body,
+      signal: request.signal,
     });
 
     // Check if response is ok before trying to parse JSON
@@ -38,13 +45,31 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    const data = await response.json();
+    if (wantsStream && response.body) {
+      return new Response(response.body, {
+        status: response.status,
+        headers: {
+          'Content-Type': 'text/event-stream',
+          'Cache-Control': 'no-cache, no-transform',
+          Connection: 'keep-alive',
+          'X-Accel-Buffering': 'no',
+        },
+      });
+    }
 
-    // Backend now returns standardized format, so we can pass it through
-    return NextResponse.json(data, { status: data.status_code || response.status });
+    // The backend already returns the standardized format, so its body is streamed through
+    // without being buffered and re-parsed. fetch has already decoded any gzip/brotli
+    // encoding, so only the content type is forwarded; the backend's compression benefits
+    // direct clients, and the browser leg relies on Next's own response compression.
+    return new Response(response.body, {
+      status: response.status,
+      headers: {
+        'Content-Type': response.headers.get('content-type') ?? 'application/json',
+      },
+    });
   } catch (error: any) {
     console.error('Error running query:', error);
-    
+
     // Provide more specific error messages
     let errorMessage = 'Error processing request';
     if (error.message?.includes('fetch')) {